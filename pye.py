@@ -20,7 +20,7 @@
 ##
 import sys, gc
 if sys.platform in ("linux", "darwin"):
-    import os, signal, tty, termios
+    import os, signal, tty, termios, select
     const = lambda x:x
     is_linux = True
 else:
@@ -29,6 +29,7 @@ else:
 if sys.implementation.name == "micropython":
     is_micropython = True
     from uio import StringIO
+    from utime import ticks_ms, ticks_diff
 else:
     is_micropython = False
     from _io import StringIO
@@ -42,6 +43,7 @@ KEY_HOME      = const(0x10)
 KEY_END       = const(0x03)
 KEY_PGUP      = const(0xfff1)
 KEY_PGDN      = const(0xfff2)
+KEY_PASTE     = const(0xfff3)
 KEY_QUIT      = const(0x11)
 KEY_ENTER     = const(0x0a)
 KEY_BACKSPACE = const(0x08)
@@ -70,6 +72,24 @@ KEY_NEXT      = const(0x17)
 KEY_MATCH     = const(0xfffd)
 KEY_INDENT    = const(0xfffe)
 KEY_UNDENT    = const(0xffff)
+KEY_SPLIT     = const(0xfff4)
+KEY_ESC       = const(0xfff5)
+
+SLOW_BAUD     = const(38400) ## up to this speed, paint the cursor row first
+END_LINE      = const(0x3fffffff) ## beyond any line number
+FRAME_SIZE    = const(2048) ## output buffer; a larger frame is sent in parts
+INPUT_SIZE    = const(256) ## input buffer, filled with all bytes waiting by a single read
+ESC_TIME      = const(100) ## ms to wait after ESC for the rest of a sequence
+GAP_LINE      = const(256) ## ASCII lines this long are edited in a gap buffer, with a gap this size
+#ifdef LINUX
+BIG_FILE      = const(20000) ## files with more lines are held in a LineTree, not on the boards
+#endif
+CHUNK_LINES   = const(512) ## most lines in a chunk of a LineTree
+WRAP_CHUNK    = const(64) ## most lines in a chunk of the wrap index, a RowTree
+LOAD_LINES    = const(256) ## lines read from a file opened per step, between keys
+VIEW_SIZE     = const(0x4000000) ## larger files are viewed from the file, read only; boards: half the free heap
+VIEW_STEP     = const(64) ## a viewed file has the offset of every VIEW_STEP-th line in its index
+VIEW_BUF      = const(4096) ## block size for indexing a viewed file on a board
 
 class Editor:
 
@@ -78,16 +98,23 @@ class Editor:
     "\x1b[B" : KEY_DOWN,
     "\x1b[D" : KEY_LEFT,
     "\x1b[C" : KEY_RIGHT,
+    "\x1bOA" : KEY_UP, ## application cursor keys
+    "\x1bOB" : KEY_DOWN,
+    "\x1bOD" : KEY_LEFT,
+    "\x1bOC" : KEY_RIGHT,
     "\x1b[H" : KEY_HOME, ## in Linux Terminal
     "\x1bOH" : KEY_HOME, ## Picocom, Minicom
     "\x1b[1~": KEY_HOME, ## Putty
     "\x1b[F" : KEY_END,  ## Linux Terminal
     "\x1bOF" : KEY_END,  ## Picocom, Minicom
     "\x1b[4~": KEY_END,  ## Putty
+    "\x1b[7~": KEY_HOME, ## rxvt
+    "\x1b[8~": KEY_END,  ## rxvt
     "\x1b[5~": KEY_PGUP,
     "\x1b[6~": KEY_PGDN,
     "\x03"   : KEY_DUP, ## Ctrl-C
     "\r"     : KEY_ENTER,
+    "\x1bOM" : KEY_ENTER, ## keypad
     "\x7f"   : KEY_BACKSPACE, ## Ctrl-? (127)
     "\x1b[3~": KEY_DELETE,
     "\x1b[Z" : KEY_BACKTAB, ## Shift Tab
@@ -113,15 +140,63 @@ class Editor:
     "\x01"   : KEY_TOGGLE, ## Ctrl-A
     "\x17"   : KEY_NEXT, ## Ctrl-W
     "\x0f"   : KEY_GET, ## Ctrl-O
+    "\x10"   : KEY_SPLIT, ## Ctrl-P
 ## other keys
     "\x1b[1;5H": KEY_FIRST, ## Ctrl-Home
     "\x1b[1;5F": KEY_LAST, ## Ctrl-End
     "\x1b[3;5~": KEY_YANK, ## Ctrl-Del
     "\x0b"   : KEY_MATCH,## Ctrl-K
     "\x1b[M" : KEY_MOUSE,
+    "\x1b[<" : KEY_MOUSE, ## SGR 1006 encoding
+    "\x1b[200~": KEY_PASTE, ## start of a bracketed paste
     }
+    ktree = None ## KEYMAP as a tree of dicts, compiled by key_tree()
+    kback = None ## key read ahead by get_input, returned next
+    GAP_KEYS = (KEY_NONE, KEY_LEFT, KEY_RIGHT, KEY_BACKSPACE, KEY_DELETE) ## keys gap_key() may handle
+    LOAD_KEYS = (KEY_WRITE, KEY_FIND, KEY_FIND_AGAIN, KEY_REPLC, KEY_LAST, KEY_GOTO,
+        KEY_MATCH) ## keys which need the whole file loaded
+    EDIT_KEYS = (KEY_NONE, KEY_PASTE, KEY_ENTER, KEY_BACKSPACE, KEY_DELETE, KEY_TAB, KEY_BACKTAB,
+        KEY_YANK, KEY_ZAP, KEY_REPLC, KEY_UNDO, KEY_WRITE) ## keys refused for a read only file
+## syntax highlighting: python keywords and the colors of the attribute chars
+    KEYWORDS = set(("False", "None", "True", "and", "as", "assert", "async",
+        "await", "break", "class", "continue", "def", "del", "elif", "else",
+        "except", "finally", "for", "from", "global", "if", "import", "in",
+        "is", "lambda", "nonlocal", "not", "or", "pass", "raise", "return",
+        "try", "while", "with", "yield", "self"))
+    COLORS = {".": b"\x1b[22;39m", "k": b"\x1b[1;34m", "s": b"\x1b[22;32m",
+        "c": b"\x1b[22;36m", "n": b"\x1b[22;35m"}
+    lexcache = {} ## color attributes of recently shown lines
 ## symbols that are shared between instances of Editor
     yank_buffer = []
+    fbuf = bytearray(FRAME_SIZE) ## output collected for one frame, sent by flush()
+    fview = memoryview(fbuf)
+    flen = 0 ## bytes used in fbuf
+    ibuf = bytearray(INPUT_SIZE) ## input read ahead, decoded by rd()
+    iview = memoryview(ibuf)
+    ipos = ilen = 0 ## next byte and end of the input in ibuf
+    sname = ("", b"", 0) ## file name shown in the status line: text, encoded, width
+    cpos = [-1, 0] ## terminal cursor row and column, row -1 if not known
+    scrtop = 0 ## top_line of the screen content in scrbuf
+    shifts = [] ## line inserts/deletes to be replayed on the screen
+    sview = None ## margin, syntax and wrap of the screen content, None if all rows must be checked
+    smark = (0, 0) ## marked lines on the screen
+    shl = [-1, 0] ## line shown scrolled in wrap mode l, and its margin
+    cmaps = {} ## screen columns of the chars of non-ASCII lines
+    stats = None ## counters if enabled: bytes, writes, frames, rows repainted, rows skipped, heap allocated
+    fstats = lstats = None ## the same for the current and for the last key
+    skey = KEY_NONE ## key of fstats
+    heap = 0 ## heap in use after the last key, for the stats
+    caps = None ## sequences beyond VT100: L IL/DL/ICH/DCH, X ECH, S SU/SD, b REP; probed once
+    baud = 0 ## speed of the link, if given
+    rate = 0 ## speed of the link as measured, in baud
+    rbytes = rtime = 0 ## bytes and ms of the writes since rate was measured
+    ytop = 0 ## first screen row of the pane shown
+    other = None ## split screen: the editor and the screen state of the other pane
+    region = -1 ## ytop of the pane the scroll region is set to
+    PANE = ("ytop", "height", "scrbuf", "rows", "scrtop", "shifts", "sview", "smark", "shl")
+    DOC = ("content", "total_lines", "undo", "undo_zero", "undo_limit", "changed", "fname", "lstate",
+           "lvalid", "syntax", "wrap", "autoindent", "write_tabs", "tab_size", "wtree", "wtouch",
+           "wwidth", "readonly", "loader", "lsize") ## what two views of the same content share
     find_pattern = ""
     case = "n"
     replc_pattern = ""
@@ -137,27 +212,53 @@ class Editor:
         self.undo_zero = 0
         self.autoindent = "y"
         self.mark = None
+        self.drag = None ## line where a drag with the left button started
         self.write_tabs = "n"
+        self.syntax = "n"
+        self.lstate = bytearray() ## lexer state at the end of each line
+        self.lvalid = 0 ## number of lines with a valid lstate entry
+        self.wrap = "n" ## long lines: n scroll the screen, y wrapped, l scroll the cursor line only
+        self.hline = 0 ## in wrap mode l, the line the margin applies to
+        self.readonly = False ## content is a FileLines view
+        self.loader = None ## file still being read by load(), between keys
+        self.lsize = 1 ## its size, for the progress shown
+        self.gline = -1 ## line held in the gap buffer gbuf while typing, or -1
+        self.gbuf = self.gview = None
+        self.gs = self.ge = 0 ## start and end of the gap
+        self.gsync = True ## content[gline] is up to date
+        self.top_sub = 0 ## first screen row of top_line shown in wrap mode
+        self.wtree = None ## wrap index: RowTree of the screen rows per line
+        self.wtouch = set() ## lines edited since the wrap index was updated
+        self.dirty = (0, 0) ## lines changed since the last display
+        self.twin = None ## another view of the same content, in split screen
 
 #ifdef LINUX
     if is_linux:
+        stats_file = None ## log of the output counters per key
 
-        def wr(self, s):
-            os.write(1, s.encode("utf-8"))
+        def send(self, b): ## write the bytes b to the terminal
+            if Editor.stats:
+                Editor.fstats[0] += len(b)
+            while b:
+                if Editor.stats:
+                    Editor.fstats[1] += 1
+                b = b[os.write(1, b):]
 
-        def rd(self):
+        def rd_raw(self, b): ## read all bytes waiting into b, at least one; None on a resize
             while True:
                 try: ## WINCH causes interrupt
-                    c = os.read(self.sdev,1)
-                    flag = c[0]
-                    while (flag & 0xc0) == 0xc0:  ## utf-8 char collection
-                        c += os.read(self.sdev,1)
-                        flag <<= 1
-                    return c.decode("UTF-8")
+                    c = os.read(self.sdev, len(b))
+                    b[:len(c)] = c
+                    return len(c)
                 except:
-                    if Editor.winch: ## simulate REDRAW key
+                    if Editor.winch:
                         Editor.winch = False
-                        return chr(KEY_REDRAW)
+                        return None
+
+        def waiting(self, ms=0): ## is more input waiting at the device?
+            if is_micropython:
+                return bool(Editor.poller.poll(ms))
+            return bool(select.select([Editor.sdev], [], [], ms / 1000)[0])
 
         @staticmethod
         def init_tty(device):
@@ -165,6 +266,9 @@ class Editor:
             tty.setraw(device)
             Editor.sdev = device
             Editor.winch = False
+            if is_micropython:
+                Editor.poller = select.poll()
+                Editor.poller.register(device, select.POLLIN)
 
         @staticmethod
         def deinit_tty():
@@ -179,11 +283,30 @@ class Editor:
 #ifdef MICROPYTHON
     if is_micropython and not is_linux:
 
-        def wr(self, s):
-            sys.stdout.write(s)
+        def send(self, b): ## write the bytes b to the terminal
+            if Editor.stats:
+                Editor.fstats[0] += len(b)
+                Editor.fstats[1] += 1
+            t = ticks_ms()
+            sys.stdout.write(b) ## takes any buffer
+            Editor.rbytes += len(b) ## short writes add up, so one stalled write is averaged out
+            Editor.rtime += ticks_diff(ticks_ms(), t)
+            if Editor.rbytes > 500: ## enough to tell the speed of the link
+                Editor.rate = int(Editor.rbytes * 10000 / max(Editor.rtime, 1))
+                Editor.rbytes = Editor.rtime = 0
+
+        def rd_raw(self, b): ## read all bytes waiting into b, at least one
+            if Editor.sany: ## the port tells how many are waiting: read them in one call
+                return Editor.sin.readinto(b, min(max(Editor.sany(), 1), len(b)))
+            n = Editor.sin.readinto(b, 1) ## else a byte per call, while the poll finds more
+            while n < len(b) and self.waiting():
+                n += Editor.sin.readinto(b[n:], 1)
+            return n
 
-        def rd(self):
-            return sys.stdin.read(1)
+        def waiting(self, ms=0): ## is more input waiting at the device?
+            if Editor.poller:
+                return bool(Editor.poller.poll(ms))
+            return ms > 0 ## cannot tell: update after every key, and ESC starts a sequence
 
         @staticmethod
         def init_tty(device):
@@ -192,6 +315,21 @@ class Editor:
                 kbd_intr(-1)
             except ImportError:
                 pass
+            Editor.sin = getattr(sys.stdin, "buffer", sys.stdin) ## bytes from USB_VCP or UART
+            Editor.sany = getattr(Editor.sin, "any", None) ## number of bytes waiting, if known
+            if Editor.sany is None:
+                try:
+                    from pyb import USB_VCP
+                    if USB_VCP().isconnected(): ## stdin reads from the USB port of a Pyboard
+                        Editor.sany = USB_VCP().any
+                except:
+                    pass
+            try:
+                from uselect import poll
+                Editor.poller = poll()
+                Editor.poller.register(sys.stdin, 1) ## POLLIN
+            except:
+                Editor.poller = None ## no typeahead check, update after every key
 
         @staticmethod
         def deinit_tty():
@@ -201,58 +339,255 @@ class Editor:
             except ImportError:
                 pass
 #endif
-    def goto(self, row, col):
-        self.wr("\x1b[{};{}H".format(row + 1, col + 1))
+    def rd(self): ## the next char of the input, decoded from ibuf
+        while True:
+            p, n = Editor.ipos, Editor.ilen
+            if p < n:
+                c = Editor.ibuf[p]
+                if c < 0x80:
+                    Editor.ipos = p + 1
+                    return chr(c)
+                k = 1 if c < 0xc0 else 2 if c < 0xe0 else 3 if c < 0xf0 else 4 ## utf-8 char length
+                if p + k <= n:
+                    Editor.ipos = p + k
+                    try:
+                        return bytes(Editor.iview[p:p + k]).decode("UTF-8")
+                    except:
+                        continue ## skip a broken char
+                Editor.ibuf[:n - p] = Editor.ibuf[p:n] ## a char split by the read, keep its start
+                n -= p
+            else:
+                n = 0
+            Editor.ipos, Editor.ilen = 0, n
+            k = self.rd_raw(Editor.iview[n:])
+            if k is None: ## simulate REDRAW key
+                return chr(KEY_REDRAW)
+            Editor.ilen = n + k
+
+    def pending(self, ms=0): ## is more input waiting?
+        return Editor.kback is not None or Editor.ipos < Editor.ilen or self.waiting(ms)
+
+    def flush(self): ## send the collected frame with a single write
+        if Editor.flen:
+            n, Editor.flen = Editor.flen, 0
+            self.send(Editor.fview[:n])
+
+    def wr(self, s): ## collect output, bytes or str; flush() sends it
+        if type(s) is str:
+            s = s.encode()
+        n = Editor.flen
+        if n + len(s) > FRAME_SIZE: ## full, send what is there
+            self.flush()
+            if len(s) > FRAME_SIZE:
+                self.send(s)
+                return
+            n = 0
+        Editor.fbuf[n:n + len(s)] = s
+        Editor.flen = n + len(s)
+
+    def num(self, n): ## write the decimal number n >= 0 digit by digit, no string built
+        if Editor.flen + 10 > FRAME_SIZE:
+            self.flush()
+        b, k = Editor.fbuf, Editor.flen
+        for p in POW10:
+            if n >= p or p == 1 or k > Editor.flen: ## no leading zeros
+                d = 48
+                while n >= p:
+                    n -= p
+                    d += 1
+                b[k] = d
+                k += 1
+        Editor.flen = k
+
+    def rpt(self, c, n): ## write the byte c n times
+        if Editor.flen + n > FRAME_SIZE:
+            self.flush()
+        for i in range(Editor.flen, Editor.flen + n):
+            Editor.fbuf[i] = c
+        Editor.flen += n
+
+    def csi(self, n, f): ## write the sequence ESC [ n f
+        self.wr(b"\x1b[")
+        self.num(n)
+        self.wr(f)
+
+    def goto(self, row, col): ## move the cursor, using the shortest sequence
+        r, c = Editor.cpos
+        Editor.cpos[0], Editor.cpos[1] = row, col
+        if r == row and c == col:
+            return
+        n = 3 + ndigits(row + 1) + (1 + ndigits(col + 1) if col else 0) ## ESC[row;colH
+## relative moves stop at the scroll region margin, so stay on one side of it
+        if r >= 0 and (r < Editor.height) == (row < Editor.height):
+            d, e = row - r, col - c
+            m = ((d if is_linux and d < 3 else 3 + ndigits(d)) if d > 0 else
+                 2 if d == -1 else 3 + ndigits(-d) if d < 0 else 0)
+            m += (1 if col == 0 else -e if -4 < e < 0 else
+                  3 + ndigits(-e) if e < 0 else 3 + ndigits(e) if e > 0 else 0)
+            if m < n: ## the lengths are counted, the moves written without a string
+                if d > 0:
+                    if is_linux and d < 3: ## LF is raw on Linux only
+                        self.rpt(10, d)
+                    else:
+                        self.csi(d, b"B")
+                elif d == -1:
+                    self.wr(b"\x1bM") ## reverse index, never at the top margin here
+                elif d < 0:
+                    self.csi(-d, b"A")
+                if col == 0:
+                    self.wr(b"\r")
+                elif -4 < e < 0:
+                    self.rpt(8, -e)
+                elif e < 0:
+                    self.csi(-e, b"D")
+                elif e > 0:
+                    self.csi(e, b"C")
+                return
+        self.wr(b"\x1b[")
+        self.num(Editor.ytop + row + 1)
+        if col:
+            self.wr(b";")
+            self.num(col + 1)
+        self.wr(b"H")
+
+    def put(self, s): ## write text at the cursor and track the cursor column
+        self.wr(self.pack(s) if len(s) > 7 and Editor.caps else s)
+        Editor.cpos[1] += len(s) if isascii(s) else str_width(s)
+        if Editor.cpos[1] >= Editor.width: ## pending wrap at the right edge
+            Editor.cpos[0] = -1
+
+    def pack(self, s): ## s with runs of a char sent as REP, or runs of blanks as ECH, if shorter
+        rep, res, i, j = "b" in Editor.caps, [], 0, 0
+        while j < len(s):
+            c, k = s[j], j + 1
+            while k < len(s) and s[k] == c:
+                k += 1
+            if k - j > 7 and " " <= c < "\x7f":
+                if rep:
+                    res.append(s[i:j + 1])
+                    res.append("\x1b[{}b".format(k - j - 1))
+                    i = k
+                elif c == " " and k - j > 11 and "X" in Editor.caps: ## erase, then skip
+                    res.append(s[i:j])
+                    res.append("\x1b[{0}X\x1b[{0}C".format(k - j))
+                    i = k
+            j = k
+        if i == 0:
+            return s
+        res.append(s[i:])
+        return "".join(res)
 
     def clear_to_eol(self):
-        self.wr("\x1b[0K")
+        self.wr(b"\x1b[K")
 
     def cursor(self, onoff):
-        self.wr("\x1b[?25h" if onoff else "\x1b[?25l")
+        self.wr(b"\x1b[?25h" if onoff else b"\x1b[?25l")
 
     def hilite(self, mode):
         if mode == 1: ## used for the status line
-            self.wr("\x1b[1;47m")
+            self.wr(b"\x1b[1;47m")
         elif mode == 2: ## used for the marked area
-            self.wr("\x1b[43m")
+            self.wr(b"\x1b[43m")
         else:         ## plain text
-            self.wr("\x1b[0m")
+            self.wr(b"\x1b[0m")
 
     def mouse_reporting(self, onoff):
-        self.wr('\x1b[?9h' if onoff else '\x1b[?9l') ## enable/disable mouse reporting
+        ## enable/disable mouse reporting: press, release and drag, SGR encoded if supported
+        self.wr('\x1b[?1000h\x1b[?1002h\x1b[?1006h' if onoff else '\x1b[?1006l\x1b[?1002l\x1b[?1000l')
 
     def scroll_region(self, stop):
-        self.wr('\x1b[1;{}r'.format(stop) if stop else '\x1b[r') ## set scrolling range
+        self.wr('\x1b[{};{}r'.format(Editor.ytop + 1, Editor.ytop + stop) if stop else '\x1b[r') ## set scrolling range
+        Editor.region = Editor.ytop if stop else -1
+        Editor.cpos[0] = -1 ## cursor went home
+
+    def pane_region(self): ## the scroll region must be the pane shown before it scrolls
+        if Editor.region != Editor.ytop:
+            self.scroll_region(Editor.height)
 
-    def scroll_up(self, scrolling):
+    def scroll_up(self, scrolling): ## shift the scroll region and scrbuf down
+        self.pane_region()
         Editor.scrbuf[scrolling:] = Editor.scrbuf[:-scrolling]
-        Editor.scrbuf[:scrolling] = [''] * scrolling
-        self.goto(0, 0)
-        self.wr("\x1bM" * scrolling)
+        Editor.scrbuf[:scrolling] = [(False,'','')] * scrolling
+        if scrolling > 1 and "S" in Editor.caps:
+            self.csi(scrolling, b"T") ## scroll down, the cursor stays
+        else:
+            self.goto(0, 0)
+            for i in range(scrolling):
+                self.wr(b"\x1bM") ## reverse index at the top margin
+        Editor.scrtop -= scrolling
 
-    def scroll_down(self, scrolling):
+    def scroll_down(self, scrolling): ## shift the scroll region and scrbuf up
+        self.pane_region()
         Editor.scrbuf[:-scrolling] = Editor.scrbuf[scrolling:]
-        Editor.scrbuf[-scrolling:] = [''] * scrolling
-        self.goto(Editor.height - 1, 0)
-        self.wr("\x1bD " * scrolling)
+        Editor.scrbuf[-scrolling:] = [(False,'','')] * scrolling
+        if scrolling > 1 and "S" in Editor.caps:
+            self.csi(scrolling, b"S") ## scroll up, the cursor stays
+        else:
+            self.goto(Editor.height - 1, 0)
+            for i in range(scrolling):
+                self.wr(b"\x1bD") ## index at the bottom margin
+        Editor.scrtop += scrolling
+
+    def shift_rows(self, lnum, n): ## replay an insert (n > 0) or delete (n < 0) of lines with IL/DL
+        row = lnum - Editor.scrtop
+        if row < 0: ## starts above the screen
+            if n > 0 or row - n <= 0: ## completely above, just renumber
+                Editor.scrtop += n
+                return
+            Editor.scrtop, n, row = lnum, n - row, 0
+        if row < Editor.height:
+            n = min(n, Editor.height - row) if n > 0 else max(n, row - Editor.height)
+            if n > 0:
+                Editor.scrbuf[row:row] = [(False,'','')] * n
+                del Editor.scrbuf[Editor.height:]
+            else:
+                del Editor.scrbuf[row:row - n]
+                Editor.scrbuf += [(False,'','')] * -n
+            self.pane_region()
+            self.goto(row, 0)
+            self.csi(abs(n), b"L" if n > 0 else b"M")
 
     def get_screen_size(self):
+        probe = Editor.caps is None
+        if probe: ## ask for the device attributes, and try REP at home: x plus 2 more
+            self.wr('\x1b[c\x1b[Hx\x1b[2b\x1b[6n')
         self.wr('\x1b[999;999H\x1b[6n')
+        Editor.cpos[0] = -1
+        self.flush()
         pos = ''
-        char = self.rd() ## expect ESC[yyy;xxxR
-        while char != 'R':
-            pos += char
-            char = self.rd()
-        return [int(i, 10) for i in pos.lstrip("\n\x1b[").split(';')]
+        while pos.count('R') < 1 + probe: ## expect [ESC[?a;b..c ESC[1;4R] ESC[yyy;xxxR
+            pos += self.rd()
+        pos = pos.split('\x1b[')
+        size = [i for i in pos if i[-1:] == 'R']
+        if probe:
+            da = [i for i in pos if i[:1] == '?' and i[-1:] == 'c'] + ['?0c']
+            try:
+                level = int(da[0][1:-1].split(';')[0]) ## 1 VT100, 6 VT102, 62.. VT220 and later
+            except:
+                level = 0
+            Editor.caps = (("L" if level == 6 or level >= 62 else "") + ("X" if level >= 62 else "") +
+                           ("S" if level >= 64 else "") + ("b" if size[0] == "1;4R" else ""))
+        return [int(i, 10) for i in size[-1][:-1].split(';')]
 
     def redraw(self, flag):
         self.cursor(False)
         Editor.height, Editor.width = self.get_screen_size()
-        Editor.height -= 1
-        Editor.scrbuf = [(False,"\x00")] * Editor.height ## force delete
+        Editor.ytop, Editor.height = 0, Editor.height - 1
+        if Editor.other: ## split screen: two panes, each with its status line
+            p, h = Editor.other, (Editor.height - 1) >> 1
+            if p["ytop"]: ## the other pane is the lower one
+                p["ytop"], p["height"], Editor.height = h + 1, Editor.height - h - 1, h
+            else:
+                p["height"], Editor.ytop, Editor.height = h, h + 1, Editor.height - h - 1
+            p["editor"].row = min(p["height"] - 1, p["editor"].row)
+            self.swap_pane()
+            self.clear_pane()
+            self.swap_pane()
+        self.clear_pane()
         self.row = min(Editor.height - 1, self.row)
         self.scroll_region(Editor.height)
         self.mouse_reporting(True) ## enable mouse reporting
+        self.wr('\x1b[?2004h') ## enable bracketed paste
 #ifdef LINUX
         if is_linux and not is_micropython:
             signal.signal(signal.SIGWINCH, Editor.signal_handler)
@@ -261,81 +596,619 @@ class Editor:
             gc.collect()
             if flag:
                 self.message = "{} Bytes Memory available".format(gc.mem_free())
+        if flag and Editor.stats:
+            self.message = ("Out {}B {}W {}F rows {}/{} heap {}, last key {}B {}W {}F rows {}/{} heap {}  ".format(
+                *(Editor.stats + Editor.lstats)) + self.message)
+
+    def clear_pane(self): ## forget the screen content of the pane shown, all rows are painted again
+        Editor.scrbuf = [(False,"\x00" * Editor.width,'')] * Editor.height ## force delete
+        Editor.rows = Editor.scrbuf[:] ## the rows of the next frame
+        Editor.sview = None
+        Editor.shifts = []
+        Editor.shl = [-1, 0]
+
+    def swap_pane(self): ## exchange the screen state with that of the other pane
+        p = Editor.other
+        for k in Editor.PANE:
+            v = getattr(Editor, k)
+            setattr(Editor, k, p[k])
+            p[k] = v
+        Editor.cpos[0] = -1 ## rows are counted from the top of the pane
+
+    def show_other(self): ## update the other pane of a split screen, if its lines may have changed
+        e = Editor.other["editor"]
+        if e.twin is self:
+            self.gap_sync()
+            self.share(e)
+        if e.dirty[0] < e.dirty[1] or Editor.other["sview"] is None:
+            self.swap_pane()
+            e.display_window(False)
+            self.swap_pane()
+
+    def share(self, e): ## bring the view e of the same content up to date
+        for k in Editor.DOC:
+            setattr(e, k, getattr(self, k, None))
+
+    def view(self): ## a second view of the content, for the other pane
+        e = Editor(self.tab_size, self.undo_limit)
+        self.share(e)
+        e.top_line, e.cur_line, e.col, e.row = self.top_line, self.cur_line, self.col, self.row
+        e.twin, self.twin = self, e
+        return e
+
+    def stats_next(self, key): ## add the counters of the last key to the totals, start new ones
+        if is_micropython: ## heap allocated since the last key, then collect to start from the same state
+            Editor.fstats[5] = gc.mem_alloc() - Editor.heap
+            gc.collect()
+            Editor.heap = gc.mem_alloc()
+        for i in range(6):
+            Editor.stats[i] += Editor.fstats[i]
+#ifdef LINUX
+        if Editor.stats_file:
+            Editor.stats_file.write("{:04x} {} {} {} {} {} {}\n".format(Editor.skey, *Editor.fstats))
+#endif
+        Editor.lstats, Editor.fstats, Editor.skey = Editor.fstats, [0] * 6, key
+
+    @staticmethod
+    def key_tree(): ## compile KEYMAP to a tree with a level per char, the leaves are the key codes
+        t = {"": ""}
+        for seq in sorted(Editor.KEYMAP, key=len):
+            n = t
+            for i in range(len(seq) - 1):
+                m = n.get(seq[i])
+                if m is None:
+                    m = n[seq[i]] = {"": seq[:i + 1]} ## a node knows its sequence for messages
+                elif type(m) is int: ## a shorter key is a prefix, it wins
+                    break
+                n = m
+            else:
+                n[seq[-1]] = Editor.KEYMAP[seq]
+        Editor.ktree = t
+        return t
+
+    @staticmethod
+    def load_keys(fname): ## add the keys of a keymap file, lines like: \e[1;5P \x06
+        with open(fname) as f:
+            for l in f:
+                l = l.split()
+                if len(l) == 2 and l[0][0] != "\x23": ## the sequence and the one it acts like
+                    Editor.KEYMAP[unescape(l[0])] = Editor.KEYMAP[unescape(l[1])]
+        Editor.ktree = None
 
-    def get_input(self):  ## read from interface/keyboard one byte each and match against function keys
+    def get_input(self):  ## the next key, with the wheel moves waiting summed up to one
+        self.flush() ## anything pending must be visible before waiting
+        if Editor.kback is not None:
+            key, Editor.kback = Editor.kback, None
+            return key
+        key, char = self.get_key()
+        if key in (KEY_SCRLUP, KEY_SCRLDN):
+            while self.pending():
+                k = self.get_key()
+                if k[0] != key:
+                    Editor.kback = k
+                    break
+                char += 1
+        return key, char
+
+    def get_key(self):  ## read from interface/keyboard and match function keys in the key tree
+        tree = Editor.ktree or self.key_tree()
         while True:
-            in_buffer = self.rd()
-            if in_buffer == '\x1b': ## starting with ESC, must be fct
+            c = self.rd()
+            k = tree.get(c)
+            if k is None: ## text, or an unused control char
+                if c >= " ":
+                    return KEY_NONE, c
+                continue
+            if c == "\x1b" and not self.pending(ESC_TIME): ## nothing follows, a lone ESC
+                return KEY_ESC, ""
+            p, m = None, ""
+            while type(k) is dict: ## a sequence, one level per char
+                c = self.rd()
+                if c == ";" and p is None: ## xterm modifiers may follow, e.g. ESC[1;5A for Ctrl-Up
+                    p = k
+                n = k.get(c)
+                if n is None and p: ## not mapped with the modifiers: skip them, and take the key without
+                    m = c
+                    while c < "@":
+                        c = self.rd()
+                        m += c
+                    n = p.get(c)
+                    if n is None and p[""] == "\x1b[1": ## the 1 is a placeholder
+                        n = tree["\x1b"]["["].get(c)
+                if n is None: ## unknown: tell, after ESC[ or ESC O skip the parameters up to the final char
+                    m = k[""] + (m or c)
+                    if len(k[""]) > 1: ## a lone ESC x, like Alt-1, ends with the x
+                        while " " <= c < "@":
+                            c = self.rd()
+                            m += c
+                    self.message = "Unknown key {!r}".format(m)
+                    return KEY_NONE, ""
+                k = n
+            if k == KEY_PASTE: ## collect the pasted text up to ESC[201~
+                in_buffer = []
                 while True:
-                    in_buffer += self.rd()
-                    c = in_buffer[-1]
-                    if c == '~' or (c.isalpha() and c != 'O'):
-                        break
-            if in_buffer in self.KEYMAP:
-                c = self.KEYMAP[in_buffer]
-                if c != KEY_MOUSE:
-                    return c, ""
-                else: ## special for mice
-                    mouse_fct = ord((self.rd())) ## read 3 more chars
-                    mouse_x = ord(self.rd()) - 33
-                    mouse_y = ord(self.rd()) - 33
-                    if mouse_fct == 0x61:
-                        return KEY_SCRLDN, ""
-                    elif mouse_fct == 0x60:
-                        return KEY_SCRLUP, ""
-                    else:
-                        return KEY_MOUSE, [mouse_x, mouse_y, mouse_fct] ## set the cursor
-            elif ord(in_buffer[0]) >= 32:
-                return KEY_NONE, in_buffer
+                    in_buffer.append(self.rd())
+                    if in_buffer[-1] == '~' and "".join(in_buffer[-6:]) == "\x1b[201~":
+                        return KEY_PASTE, "".join(in_buffer[:-6])
+            elif k != KEY_MOUSE:
+                return k, ""
+            else: ## special for mice: button, column and row
+                if c == "<": ## ESC[<b;x;yM, m at a release
+                    p, i = [0, 0, 0], 0
+                    while True:
+                        c = self.rd()
+                        if c == ";":
+                            i = min(i + 1, 2)
+                        elif "0" <= c <= "9":
+                            p[i] = p[i] * 10 + ord(c) - 48
+                        else:
+                            break
+                    b, x, y = p[0] if c == "M" else p[0] | 3, p[1] - 1, p[2] - 1
+                else: ## ESC[Mbxy, each + 32
+                    b = ord(self.rd()) - 32
+                    x = ord(self.rd()) - 33
+                    y = ord(self.rd()) - 33
+                if b & 64: ## wheel
+                    return (KEY_SCRLDN if b & 1 else KEY_SCRLUP), 1
+                return KEY_MOUSE, [x, y, b] ## b: 0..2 press, 3 release, + 32 drag, + 16 Ctrl
 
-    def display_window(self): ## Update window and status line
+    def align_window(self): ## keep the cursor in the content and in the window
 ## Force cur_line and col to be in the reasonable bounds
         self.cur_line = min(self.total_lines - 1, max(self.cur_line, 0))
-        self.col = max(0, min(self.col, len(self.content[self.cur_line])))
+        if self.gline != self.cur_line:
+            l = self.content[self.cur_line]
+            n = len(l)
+        else: ## the line in the gap buffer is ASCII, one cell per char like "", which stands in for it
+            l, n = "", self.gap_len()
+        self.col = max(0, min(self.col, n))
+        if not isascii(l):
+            while 0 < self.col < len(l) and char_width(l[self.col]) == 0:
+                self.col -= 1 ## stay on the base of a combined char
+        if self.wrap == "y": ## screen rows counted by the wrap index
+            self.margin = 0
+            c = self.wrap_row()
+            t = self.wrap_prefix(min(self.top_line, self.total_lines)) + self.top_sub
+            if not (t <= c < t + Editor.height):
+                t = max(c - self.row, 0)
+            self.top_line, self.top_sub = self.wrap_find(t)
+            self.row = c - t
+            return t
 ## Check if Column is out of view, and align margin if needed
-        if self.col >= Editor.width + self.margin:
-            self.margin = self.col - Editor.width + (Editor.width >> 2)
-        elif self.col < self.margin:
-            self.margin = max(self.col - (Editor.width >> 2), 0)
+        w = Editor.width
+        if self.wrap == "l": ## only the cursor line scrolls, keep the cursor off the < and > marks
+            if self.hline != self.cur_line: ## on another line, which starts unscrolled
+                self.margin, self.hline = 0, self.cur_line
+            w -= 1
+        c = self.scol(l, self.col)
+        if (self.scol(l, self.col + 1) if self.col < n else c + 1) > w + self.margin:
+            self.margin = c - w + (w >> 2)
+        elif c < self.margin + (self.wrap == "l"):
+            self.margin = max(c - (w >> 2), 0)
 ## if cur_line is out of view, align top_line to the given row
         if not (self.top_line <= self.cur_line < self.top_line + Editor.height): # Visible?
             self.top_line = max(self.cur_line - self.row, 0)
 ## in any case, align row to top_line and cur_line
         self.row = self.cur_line - self.top_line
+        return self.top_line
+
+    def cmap(self, l): ## screen column of each char of l and of its end, None if one cell each
+        if isascii(l):
+            return None
+        try:
+            return Editor.cmaps[l]
+        except KeyError:
+            pass
+        m, c, k = [0], 0, 0
+        for ch in l:
+            w = char_width(ch)
+            c += w
+            k += w != 1
+            m.append(c)
+        if len(Editor.cmaps) > 4 * Editor.height: ## keep the cache small
+            Editor.cmaps.clear()
+        Editor.cmaps[l] = m = m if k else None
+        return m
+
+    def scol(self, l, i): ## screen column of the char at index i of l
+        m = self.cmap(l)
+        return i if m is None else m[i]
+
+    def sidx(self, l, c): ## index of the first char of l at or right of screen column c
+        m = self.cmap(l)
+        if m is None:
+            return c
+        i = lower_bound(m, c)
+        while i < len(l) and m[i + 1] == m[i]: ## skip the marks of a combined char
+            i += 1
+        return i
+
+    def cells(self, l, c, w): ## chars a:b of l shown in the screen columns c to c + w - 1 after pad blanks
+        m = self.cmap(l)
+        if m is None:
+            return c, c + w, 0
+        a = min(lower_bound(m, c), len(l))
+        while 0 < a < len(l) and m[a + 1] == m[a]: ## marks of a char left of the window
+            a += 1
+        return a, lower_bound(m, c + w + 1) - 1, m[a] - c
+
+    def wrap_starts(self, l): ## indices of the chars of l starting a screen row in wrap mode
+        m = self.cmap(l)
+        if m is None:
+            return range(0, len(l) + 1, Editor.width)
+        s, r = 0, [0]
+        while m[-1] - m[s] >= Editor.width: ## the end of line needs a cell too
+            s = max(lower_bound(m, m[s] + Editor.width + 1) - 1, s + 1)
+            r.append(s)
+        return r
+
+    def wrap_pos(self): ## row in the cursor line and screen column of the cursor in wrap mode
+        l = self.content[self.cur_line]
+        if isascii(l):
+            return divmod(self.col, Editor.width)
+        r = self.wrap_starts(l)
+        k = lower_bound(r, self.col + 1) - 1
+        return k, self.scol(l, self.col) - self.scol(l, r[k])
+
+    def wrap_sync(self): ## bring the wrap index up to date
+        n = self.total_lines
+        if self.wtree is None or len(self.wtree) != n or self.wwidth != Editor.width:
+            self.wwidth = Editor.width
+            self.wtree = RowTree([self.line_rows(l) for l in self.content])
+            self.touch(0) ## rows may have moved anywhere
+        else:
+            t = self.wtree
+            for i in self.wtouch:
+                if i < n:
+                    d = self.line_rows(self.content[i])
+                    if d != t[i]: ## the rows below moved
+                        t[i] = d
+                        self.touch(i + 1)
+        self.wtouch.clear()
+
+    def line_rows(self, l): ## screen rows of a line in wrap mode, with room for the cursor at its end
+        return divmod(len(l), Editor.width)[0] + 1 if isascii(l) else len(self.wrap_starts(l))
+
+    def wrap_prefix(self, i): ## number of screen rows of the lines before line i
+        return self.wtree.rows(i)
+
+    def wrap_find(self, r): ## line and row in that line of the screen row r
+        i, r = self.wtree.find_row(r)
+        if i >= self.total_lines: ## below the last line
+            i = self.total_lines - 1
+            r = self.line_rows(self.content[i]) - 1
+        return i, r
+
+    def wrap_row(self): ## screen row of the cursor in wrap mode
+        self.wrap_sync()
+        return self.wrap_prefix(self.cur_line) + self.wrap_pos()[0]
+
+    def wrap_goto(self, r, c=None): ## move the cursor to screen row r and column c, default the same
+        if c is None:
+            c = self.wrap_pos()[1]
+        self.cur_line, k = self.wrap_find(max(r, 0))
+        l = self.content[self.cur_line]
+        r = self.wrap_starts(l)
+        self.col = min(self.sidx(l, self.scol(l, r[k]) + c), r[k + 1] - 1 if k + 1 < len(r) else len(l))
+
+    def display_window(self, focus = True): ## Update window and status line, the cursor if focus
+        top = self.align_window()
 ## update_screen
         self.cursor(False)
-        i = self.top_line
+## move rows for inserted or deleted lines, then reuse the part of the
+## screen that stays visible after a move of top_line
+        if self.wrap != "y" and "L" in Editor.caps: ## in wrap mode scrtop counts screen rows
+            for i in Editor.shifts:
+                self.shift_rows(*i)
+        del Editor.shifts[:]
+        i = top - Editor.scrtop
+        fa = fb = 0 ## rows scrolled into the window
+        if 0 < i < Editor.height:
+            self.scroll_down(i)
+            fa, fb = Editor.height - i, Editor.height
+        elif 0 < -i < Editor.height:
+            self.scroll_up(-i)
+            fb = -i
+        elif i:
+            Editor.sview = None
+        Editor.scrtop = top
+## only rows of changed lines, of lines marked or unmarked, and new rows
+## must be built and compared; the others are taken from scrbuf
+        view = (self.margin if self.wrap == "n" else 0) * 8 + (self.syntax == "y") * 4 + "nyl".find(self.wrap)
+        full, Editor.sview = Editor.sview != view, view
+        lo, hi = self.dirty
+        self.dirty = (0, 0)
+        if self.syntax == "y" and lo < self.top_line:
+            hi = END_LINE ## a lexer state change above may reach the window
+        m = self.line_range() if self.mark is not None else (0, 0)
+        ma, mb = Editor.smark
+        if ma == mb:
+            ma = mb = m[0]
+        Editor.smark = m
+        ha = hb = -1 ## lines to build in wrap mode l, if the scrolled line moved or scrolled
+        if self.wrap == "l" and (Editor.shl[0] != (self.cur_line if self.margin else -1) or
+                                 Editor.shl[1] != self.margin):
+            ha, hb = Editor.shl[0], self.cur_line
+            Editor.shl[0], Editor.shl[1] = hb if self.margin else -1, self.margin
+        i, s, rows = self.top_line, self.top_sub, Editor.rows
         for c in range(Editor.height):
             if i == self.total_lines: ## at empty bottom screen part
-                if Editor.scrbuf[c] != (False,''):
-                    self.goto(c, 0)
-                    self.clear_to_eol()
-                    Editor.scrbuf[c] = (False,'')
+                rows[c] = (False, '', '')
+                continue
+            l = self.content[i] if i != self.gline else "" ## no scan of the line in the gap buffer
+            d = self.dirty ## and the lines below a lexer state change found here
+            if not (full or lo <= i < hi or d[0] <= i < d[1] or fa <= c < fb or min(ma, m[0]) <= i < max(ma, m[0]) or
+                    min(mb, m[1]) <= i < max(mb, m[1]) or i == ha or i == hb):
+                n = self.line_rows(l) if self.wrap == "y" else 1
+                rows[c] = Editor.scrbuf[c] ## unchanged
+            else:
+                if self.wrap == "y":
+                    r = self.wrap_starts(l)
+                    n = len(r)
+                    a, b, pad = r[s], r[s + 1] if s + 1 < n else len(l), 0
+                else:
+                    n = 1
+                    mg = self.margin if self.wrap == "n" or i == self.cur_line else 0
+                    a, b, pad = self.cells(l, mg, Editor.width)
+                    right = b < (self.gap_len() if i == self.gline else len(l))
+                    cut = self.wrap == "l" and (mg > 0 or right)
+                    if i == self.gline: ## the part shown of the line in the gap buffer
+                        l, a, b = self.gap_text(a, b), 0, b - a
+                l = (m[0] <= i < m[1], l[a:b], self.line_attrs(i)[a:b] if self.syntax == "y" else "")
+                if pad > 0: ## a wide char cut by the left margin
+                    l = (l[0], " " * pad + l[1], "." * pad + l[2] if l[2] else "")
+                if self.wrap == "l" and cut:
+                    l = self.cut_marks(l, mg > 0, right)
+                rows[c] = l
+            if s + 1 < n:
+                s += 1 ## next part of a wrapped line
             else:
-                l = (self.mark is not None and (
-                    (self.mark <= i <= self.cur_line) or (self.cur_line <= i <= self.mark)),
-                     self.content[i][self.margin:self.margin + Editor.width])
-                if l != Editor.scrbuf[c]: ## line changed, print it
-                    self.goto(c, 0)
-                    if l[0]:
-                        self.hilite(2)
-                    self.wr(l[1])
-                    if len(l[1]) < Editor.width:
-                        self.clear_to_eol()
-                    if l[0]:
-                        self.hilite(0)
-                    Editor.scrbuf[c] = l
                 i += 1
-## display Status-Line
+                s = 0
+        self.dirty = (0, 0) ## the lexer state changes found were built in
+        slow = 0 < (Editor.baud or Editor.rate) <= SLOW_BAUD
+        if slow: ## cursor row and status line first, then the rows around it
+            order = [self.row]
+            for i in range(1, Editor.height):
+                if self.row - i >= 0:
+                    order.append(self.row - i)
+                if self.row + i < Editor.height:
+                    order.append(self.row + i)
+        c = Editor.height ## clear blank rows at the bottom at once
+        while c > 0 and rows[c - 1] == (False, '', ''):
+            c -= 1
+        n = 0
+        for i in range(c, Editor.height):
+            if Editor.scrbuf[i] != rows[i]:
+                n += 1
+        if n > 1 and not (Editor.other and Editor.other["ytop"] > Editor.ytop): ## not above a pane
+            self.goto(c, 0)
+            self.wr(b"\x1b[J") ## the status line follows anyway
+            for i in range(c, Editor.height):
+                Editor.scrbuf[i] = rows[i]
+        n = 0
+        for c in range(Editor.height):
+            if slow:
+                c = order[c]
+            l = rows[c]
+            if l != Editor.scrbuf[c]: ## line changed, print the difference
+                self.update_line(c, Editor.scrbuf[c], l)
+                Editor.scrbuf[c] = l
+                n += 1
+            if slow:
+                if c == self.row:
+                    self.status_line()
+                if Editor.flen:
+                    self.flush()
+                    if self.pending(): ## stop, scrbuf keeps the rows not painted
+                        Editor.sview = None
+                        break
+        if Editor.stats: ## count frame and rows repainted or skipped
+            f = Editor.fstats
+            f[2], f[3], f[4] = f[2] + 1, f[3] + n, f[4] + Editor.height - n
+        if not slow:
+            self.status_line()
+        if focus:
+            self.goto(self.row, (self.wrap_pos()[1] if self.wrap == "y" else self.col if self.gline == self.cur_line
+                                 else self.scol(self.content[self.cur_line], self.col)) - self.margin)
+            self.cursor(True)
+            self.flush()
+
+    def cut_marks(self, row, left, right): ## mark the cut ends of a row with < and >
+        mk, t, at = row
+        if right:
+            w = str_width(t)
+            while w > Editor.width - 1:
+                w -= char_width(t[-1])
+                t, at = t[:-1], at[:-1]
+            t, at = t + ">", at and at + "."
+        if left and t:
+            k = 1
+            while k < len(t) and char_width(t[k]) == 0: ## with the marks of a combined char
+                k += 1
+            g = " " * (char_width(t[0]) - 1) ## a wide char leaves a gap
+            t, at = "<" + g + t[k:], at and "." * (1 + len(g)) + at[k:]
+        return (mk, t, at)
+
+    def status_line(self): ## display Status-Line
         self.goto(Editor.height, 0)
         self.hilite(1)
-        self.wr("{}{} Row: {}/{} Col: {}  {}".format(
-            self.changed, self.fname, self.cur_line + 1, self.total_lines,
-            self.col + 1, self.message)[:self.width - 1])
+        if Editor.sname[0] is not self.fname: ## encode the file name once
+            Editor.sname = (self.fname, self.fname.encode(), str_width(self.fname))
+        w = (len(self.changed) + Editor.sname[2] + 15 + ndigits(self.cur_line + 1) +
+             ndigits(self.total_lines) + ndigits(self.col + 1))
+        if w + len(self.message) < Editor.width: ## fits: write the parts, no string built
+            if self.changed:
+                self.wr(b"*")
+            self.wr(Editor.sname[1])
+            self.wr(b" Row: ")
+            self.num(self.cur_line + 1)
+            self.wr(b"/")
+            self.num(self.total_lines)
+            self.wr(b" Col: ")
+            self.num(self.col + 1)
+            self.wr(b"  ")
+            Editor.cpos[1] = w
+            if self.message:
+                self.put(self.message)
+        else:
+            self.put("{}{} Row: {}/{} Col: {}  {}".format(
+                self.changed, self.fname, self.cur_line + 1, self.total_lines,
+                self.col + 1, self.message)[:self.width - 1])
         self.clear_to_eol() ## once moved up for mate/xfce4-terminal issue with scroll region
         self.hilite(0)
-        self.goto(self.row, self.col - self.margin)
-        self.cursor(True)
+
+    def update_line(self, row, old, new): ## rewrite only the changed part of a screen line
+        o, n, oa, na = old[1], new[1], old[2], new[2]
+        if old[0] != new[0] or (o and (oa == "") != (na == "")):
+            o = "\x00" * Editor.width ## repaint the whole line
+        p = cmp_head(o, n, 0, len(n)) ## skip the unchanged head
+        if na:
+            p = min(p, cmp_head(oa, na, 0, len(n)))
+        if is_wide(o) or is_wide(n): ## columns differ from indices: rewrite the tail
+            while p > 0 and ((p < len(n) and char_width(n[p]) == 0) or
+                             (p < len(o) and char_width(o[p]) == 0)):
+                p -= 1 ## start at the base of a combined char
+            if new[0]:
+                self.hilite(2)
+            self.goto(row, str_width(n[:p]))
+            self.put_colored(n[p:], na[p:])
+            if str_width(o[p:]) > str_width(n[p:]):
+                self.clear_to_eol()
+            if new[0]:
+                self.hilite(0)
+            return
+## Try plain overwrite, and d chars inserted (d > 0) or deleted (d < 0) at p, up to 8.
+## The shifted old line is compared in place by cmp_head/cmp_tail, nothing is built.
+        d, lim, w = 0, 8 if "L" in Editor.caps else 0, Editor.width
+        bc = END_LINE
+        while d <= lim:
+            if d == 0 or (len(o) > p - min(d, 0) and ## the 8 chars after the shift must match
+                          same8(o, p - min(d, 0), n, p + max(d, 0))):
+                ls = min(len(o) + d, w) ## length of the shifted line
+                f = cmp_head(o, n, p, len(n), p, d, " ")
+                g = cmp_tail(o, n, f, len(n), p, d, " ")
+                if na: ## a color change counts as a difference too
+                    fa = cmp_head(oa, na, p, len(n), p, d, ".")
+                    if fa < len(n):
+                        ga = cmp_tail(oa, na, fa, len(n), p, d, ".")
+                        if f == g:
+                            f, g = fa, ga
+                        else:
+                            f, g = min(f, fa), max(g, ga)
+                if f >= ls and not new[0]: ## over blank screen, skip leading blanks
+                    h = f
+                    while h < g and n[h] == " ":
+                        h += 1
+                    if h - f > 3:
+                        f = h
+                h = max(len(n), p + d) - d ## any char left beyond the new line?
+                while h < min(len(o), w - d) and o[h] == " ":
+                    h += 1
+                el = h < min(len(o), w - d)
+                cost = g - f + 3 * el + ((3 + ndigits(abs(d)) + (6 if f > p else 0)) if d else 0) ## ESC[dP, goto
+                if cost < bc:
+                    bc, bd, bf, bg, bel = cost, d, f, g, el
+            d = -d if d > 0 else 1 - d ## 0, 1, -1, 2, -2, ...
+        d, f, g, el = bd, bf, bg, bel
+        if new[0]:
+            self.hilite(2)
+        if d:
+            self.goto(row, p)
+            self.wr(b"\x1b[")
+            self.num(abs(d))
+            self.wr(b"@" if d > 0 else b"P")
+        if f < g:
+            self.goto(row, f)
+            self.put_colored(n[f:g], na[f:g])
+        if el:
+            if g != len(n) or f == g:
+                self.goto(row, len(n))
+            self.clear_to_eol()
+        if new[0]:
+            self.hilite(0)
+
+    def put_colored(self, text, attrs): ## write text in the colors given by attrs
+        i, cur = 0, "."
+        while i < len(attrs):
+            j = i + 1
+            while j < len(attrs) and attrs[j] == attrs[i]:
+                j += 1
+            if attrs[i] != cur:
+                cur = attrs[i]
+                self.wr(Editor.COLORS[cur])
+            self.put(text[i:j])
+            i = j
+        if cur != ".":
+            self.wr(Editor.COLORS["."])
+        self.put(text[i:])
+
+    def lex(self, l, state, color): ## python lexer: state at the end of the line and color attributes
+## state 0: plain, 1 or 2: in a triple quoted string. Without color just return the state.
+        i, n, a = 0, len(l), []
+        if state:
+            i = l.find("'''" if state == 1 else '"""')
+            if i < 0:
+                return "s" * n, state
+            i += 3
+            state = 0
+            a.append("s" * i)
+        while i < n:
+            c = l[i]
+            j = i + 1
+            if c == "\x23": ## comment
+                a.append("c" * (n - i))
+                break
+            elif c in "\'\"":
+                if l[i:i + 3] == c * 3: ## triple quoted
+                    j = l.find(c * 3, i + 3)
+                    if j < 0:
+                        a.append("s" * (n - i))
+                        return "".join(a), 1 if c == "\'" else 2
+                    j += 3
+                else:
+                    while j < n and l[j] != c:
+                        j += 2 if l[j] == "\\" else 1
+                    j = min(j + 1, n)
+                a.append("s" * (j - i))
+            elif not color:
+                a.append(".")
+            elif c.isalpha() or c == "_":
+                while j < n and (l[j].isalpha() or l[j].isdigit() or l[j] == "_"):
+                    j += 1
+                a.append(("k" if l[i:j] in Editor.KEYWORDS else ".") * (j - i))
+            elif c.isdigit():
+                while j < n and (l[j].isalpha() or l[j].isdigit() or l[j] == "."):
+                    j += 1
+                a.append("n" * (j - i))
+            else:
+                a.append(".")
+            i = j
+        return "".join(a) if color else None, state
+
+    def line_attrs(self, i): ## color attributes of line i, lexed again only if line or state changed
+        if len(self.lstate) < self.total_lines:
+            self.lstate.extend(bytearray(self.total_lines - len(self.lstate)))
+        while self.lvalid < i: ## bring the cached line states up to line i
+            l = self.content[self.lvalid]
+            self.set_state(self.lvalid, self.lex(l, self.lvalid and self.lstate[self.lvalid - 1],
+                False)[1] if ("\'" in l or '"' in l or self.lvalid and self.lstate[self.lvalid - 1]) else 0)
+            self.lvalid += 1
+        state, l = i and self.lstate[i - 1], self.content[i]
+        res = Editor.lexcache.get(l)
+        if res is None or res[0] != state:
+            if len(Editor.lexcache) > 4 * Editor.height:
+                Editor.lexcache.clear()
+            res = (state,) + self.lex(l, state, True)
+            Editor.lexcache[l] = res
+        if i == self.lvalid:
+            self.set_state(i, res[2])
+            self.lvalid += 1
+        return res[1]
+
+    def set_state(self, i, state): ## lexer state at the end of line i; if it changed, the next line must be shown anew
+        if self.lstate[i] != state:
+            self.lstate[i] = state
+            self.touch(i + 1, i + 2) ## in both views, which share lstate
 
     def spaces(self, line, pos = None): ## count spaces
         return (len(line) - len(line.lstrip(" ")) if pos is None else ## at line start
@@ -346,32 +1219,35 @@ class Editor:
                 (self.cur_line, self.mark + 1))
 
     def line_edit(self, prompt, default):  ## better one: added cursor keys and backsp, delete
-        push_msg = lambda msg: self.wr(msg + "\b" * len(msg)) ## Write a message and move cursor back
+        def push_msg(msg): ## Write a message and move cursor back
+            self.wr(msg)
+            self.rpt(8, str_width(msg))
         self.goto(Editor.height, 0)
+        Editor.cpos[0] = -1 ## not tracked while editing
         self.hilite(1)
         self.wr(prompt)
-        self.wr(default)
+        res = default[:max(Editor.width - len(prompt) - 2, 0)] ## on the status line, not beyond
+        self.wr(res)
         self.clear_to_eol()
-        res = default
         pos = len(res)
         while True:
             key, char = self.get_input()  ## Get Char of Fct.
             if key in (KEY_ENTER, KEY_TAB): ## Finis
                 self.hilite(0)
                 return res
-            elif key == KEY_QUIT: ## Abort
+            elif key in (KEY_QUIT, KEY_ESC): ## Abort
                 self.hilite(0)
                 return None
             elif key == KEY_LEFT:
                 if pos > 0:
-                    self.wr("\b")
                     pos -= 1
+                    self.rpt(8, char_width(res[pos]))
             elif key == KEY_RIGHT:
                 if pos < len(res):
                     self.wr(res[pos])
                     pos += 1
             elif key == KEY_HOME:
-                self.wr("\b" * pos)
+                self.rpt(8, str_width(res[:pos]))
                 pos = 0
             elif key == KEY_END:
                 self.wr(res[pos:])
@@ -382,20 +1258,23 @@ class Editor:
                     push_msg(res[pos:] + ' ') ## update tail
             elif key == KEY_BACKSPACE: ## Backspace
                 if pos > 0:
+                    self.rpt(8, char_width(res[pos - 1]))
                     res = res[:pos-1] + res[pos:]
-                    self.wr("\b")
                     pos -= 1
                     push_msg(res[pos:] + ' ') ## update tail
             elif key == KEY_ZAP: ## Get from content
                 if Editor.yank_buffer:
-                    self.wr('\b' * pos + ' ' * len(res) + '\b' * len(res))
+                    self.rpt(8, str_width(res[:pos]))
+                    self.rpt(32, str_width(res))
+                    self.rpt(8, str_width(res))
                     res = Editor.yank_buffer[0].strip()[:Editor.width - len(prompt) - 2]
                     self.wr(res)
                     pos = len(res)
-            elif key == KEY_NONE: ## char to be inserted
-                if len(prompt) + len(res) < self.width - 2:
+            elif key in (KEY_NONE, KEY_PASTE): ## char(s) to be inserted, only the first line of a paste
+                char = printable(char.split("\r")[0].split("\n")[0])[:self.width - 2 - len(prompt) - len(res)]
+                if char:
                     res = res[:pos] + char + res[pos:]
-                    self.wr(res[pos])
+                    self.wr(char)
                     pos += len(char)
                     push_msg(res[pos:]) ## update tail
 
@@ -439,6 +1318,10 @@ class Editor:
 
     def undo_add(self, lnum, text, key, span = 1):
         self.changed = '*'
+        self.lvalid = min(self.lvalid, lnum) ## lines from lnum on need lexing again
+        self.touch(lnum, lnum + span if text is not None and span == len(text) else END_LINE)
+        if self.wtree is not None: ## count the rows of these lines again; shift_add moves the others
+            self.wtouch.update(range(lnum, lnum + (-span if text is None else max(span, len(text)))))
         if self.undo_limit > 0 and (
            len(self.undo) == 0 or key == KEY_NONE or self.undo[-1][3] != key or self.undo[-1][0] != lnum):
             if len(self.undo) >= self.undo_limit: ## drop oldest undo, if full
@@ -446,47 +1329,177 @@ class Editor:
                 self.undo_zero -= 1
             self.undo.append([lnum, span, text, key, self.col])
 
+    def touch(self, lo, hi = END_LINE): ## note lines lo to hi - 1 as changed for the next display
+        e = self
+        while e: ## in this view and in the other view of the content, if any
+            a, b = e.dirty
+            e.dirty = (lo, hi) if a >= b else (min(a, lo), max(b, hi))
+            e = e.twin if e is self else None
+
+    def shift_add(self, lnum, n): ## note n lines inserted (n > 0) or deleted at lnum for the screen
+        if n == 0:
+            return
+        if self.wtree is not None: ## and in the wrap index, the rows of new lines counted later
+            if n > 0:
+                self.wtree[lnum:lnum] = [0] * n
+            else:
+                del self.wtree[lnum:lnum - n]
+            t = [i if i < lnum else i + n for i in self.wtouch if i < lnum or i >= lnum - n]
+            self.wtouch.clear() ## in place, a second view shares it
+            self.wtouch.update(t)
+            self.wtouch.update(range(lnum, lnum + n))
+        if Editor.shifts:
+            l, m = Editor.shifts[-1]
+            if (n > 0 and m > 0 and lnum == l + m) or (n < 0 and m < 0 and lnum == l):
+                Editor.shifts[-1] = (l, m + n) ## merge with the previous one
+                return
+        Editor.shifts.append((lnum, n))
+
     def delete_lines(self, yank): ## copy marked lines (opt) and delete them
         lrange = self.line_range()
         if yank:
             Editor.yank_buffer = self.content[lrange[0]:lrange[1]]
         self.undo_add(lrange[0], self.content[lrange[0]:lrange[1]], KEY_NONE, 0) ## undo inserts
         del self.content[lrange[0]:lrange[1]]
-        if self.content == []: ## if all was wiped
+        self.shift_add(lrange[0], lrange[0] - lrange[1])
+        if not self.content: ## if all was wiped
             self.content = [""] ## add a line
             self.undo[-1][1] = 1 ## tell undo to overwrite this single line
         self.total_lines = len(self.content)
         self.cur_line = lrange[0]
-        self.mark = None ## unset line mark
+        self.mark = self.drag = None ## unset line mark, the lines of a drag may be gone
+
+## Typing on a long ASCII line edits it in place in a gap buffer. content[gline] is
+## written back by gap_sync() when an undo record needs it, and when gap_close()
+## ends the gap buffer, at any key other than those handled by gap_key().
+    def gap_open(self):
+        l = self.content[self.cur_line]
+        if len(l) < GAP_LINE or self.syntax == "y" or self.wrap == "y" or not isascii(l):
+            return False
+        n = len(l)
+        self.gbuf = bytearray(n + GAP_LINE)
+        self.gview = memoryview(self.gbuf)
+        self.gview[:n] = l.encode()
+        self.gline, self.gs, self.ge, self.gsync = self.cur_line, n, n + GAP_LINE, True
+        return True
+
+    def gap_close(self):
+        if self.gline >= 0:
+            self.gap_sync()
+            self.gline, self.gbuf, self.gview = -1, None, None
+
+    def gap_sync(self): ## write the line in the gap buffer back to content
+        if not self.gsync:
+            n = self.gap_len()
+            self.gap_move(n)
+            self.content[self.gline] = str(self.gview[:n], "ascii")
+            self.gsync = True
+
+    def gap_len(self):
+        return len(self.gbuf) - self.ge + self.gs
+
+    def gap_move(self, c): ## move the gap to char c
+        s, e, v = self.gs, self.ge, self.gview
+        if c < s:
+            v[e - s + c:e] = v[c:s]
+        elif c > s:
+            v[s:c] = v[e:e + c - s]
+        self.gs, self.ge = c, e + c - s
+
+    def gap_text(self, a, b): ## chars a:b of the line in the gap buffer
+        s, d, v = self.gs, self.ge - self.gs, self.gview
+        b = min(b, len(self.gbuf) - d)
+        if b <= s:
+            return str(v[a:b], "ascii")
+        if a >= s:
+            return str(v[a + d:b + d], "ascii")
+        return str(v[a:s], "ascii") + str(v[s + d:b + d], "ascii")
+
+    def gap_undo(self, key): ## note the change of the line in the gap buffer
+        u = self.undo
+        if self.undo_limit > 0 and (not u or u[-1][3] != key or u[-1][0] != self.cur_line):
+            self.gap_sync() ## a new undo record takes the line as it is now
+        self.undo_add(self.cur_line, [self.content[self.cur_line]], key)
+        self.gsync = False
+
+    def gap_key(self, key, char): ## handle key in the gap buffer; False if it has to go the usual way
+        if key not in Editor.GAP_KEYS:
+            return False
+        if self.gline != self.cur_line:
+            if key in (KEY_LEFT, KEY_RIGHT):
+                return False
+            self.gap_close()
+            if not self.gap_open():
+                return False
+        c, n = self.col, self.gap_len()
+        if key == KEY_NONE:
+            if not "" < char < "\x80":
+                return False
+            self.mark = None
+            self.gap_undo(0x41) ## words are not undone one by one here, a line copy each
+            self.gap_move(c)
+            if self.gs == self.ge: ## full, grow by GAP_LINE or an eighth
+                g = max(GAP_LINE, n >> 3)
+                b = bytearray(n + g)
+                v = memoryview(b)
+                v[:c] = self.gview[:c]
+                v[c + g:] = self.gview[c:]
+                self.gbuf, self.gview, self.ge = b, v, c + g
+            self.gbuf[c] = ord(char)
+            self.gs, self.col = c + 1, c + 1
+        elif key == KEY_LEFT:
+            if c == 0:
+                return False
+            self.col = c - 1
+        elif key == KEY_RIGHT:
+            if c >= n:
+                return False
+            self.col = c + 1
+        elif self.mark is not None:
+            return False
+        elif key == KEY_BACKSPACE:
+            if c == 0:
+                return False
+            self.gap_undo(KEY_BACKSPACE)
+            self.gap_move(c)
+            self.gs, self.col = c - 1, c - 1
+        else: ## KEY_DELETE
+            if c >= n:
+                return False
+            self.gap_undo(KEY_DELETE)
+            self.gap_move(c)
+            self.ge += 1
+        return True
 
     def handle_edit_keys(self, key, char): ## keys which change content
+        if self.gap_key(key, char):
+            return
+        self.gap_close()
         l = self.content[self.cur_line]
         if key == KEY_DOWN:
-            if self.cur_line < self.total_lines - 1:
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() + 1)
+            elif self.cur_line < self.total_lines - 1:
                 self.cur_line += 1
-                if self.cur_line == self.top_line + Editor.height:
-                    self.scroll_down(1)
         elif key == KEY_UP:
-            if self.cur_line > 0:
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() - 1)
+            elif self.cur_line > 0:
                 self.cur_line -= 1
-                if self.cur_line < self.top_line:
-                    self.scroll_up(1)
         elif key == KEY_LEFT:
             if self.col == 0 and self.cur_line > 0:
                 self.cur_line -= 1
                 self.col = len(self.content[self.cur_line])
-                if self.cur_line < self.top_line:
-                    self.scroll_up(1)
             else:
                 self.col -= 1
         elif key == KEY_RIGHT:
             if self.col >= len(l) and self.cur_line < self.total_lines - 1:
                 self.col = 0
                 self.cur_line += 1
-                if self.cur_line == self.top_line + Editor.height:
-                    self.scroll_down(1)
             else:
                 self.col += 1
+                while self.col < len(l) and char_width(l[self.col]) == 0:
+                    self.col += 1 ## skip the marks of a combined char
         elif key == KEY_DELETE:
             if self.mark is not None:
                 self.delete_lines(False)
@@ -496,6 +1509,7 @@ class Editor:
             elif (self.cur_line + 1) < self.total_lines: ## test for last line
                 self.undo_add(self.cur_line, [l, self.content[self.cur_line + 1]], KEY_NONE)
                 self.content[self.cur_line] = l + self.content.pop(self.cur_line + 1)
+                self.shift_add(self.cur_line + 1, -1)
                 self.total_lines -= 1
         elif key == KEY_BACKSPACE:
             if self.mark is not None:
@@ -508,22 +1522,42 @@ class Editor:
                 self.undo_add(self.cur_line - 1, [self.content[self.cur_line - 1], l], KEY_NONE)
                 self.col = len(self.content[self.cur_line - 1])
                 self.content[self.cur_line - 1] += self.content.pop(self.cur_line)
+                self.shift_add(self.cur_line, -1)
                 self.cur_line -= 1
                 self.total_lines -= 1
-        elif key == KEY_NONE: ## character to be added
+        elif key == KEY_NONE and char: ## character to be added
             self.mark = None
             self.undo_add(self.cur_line, [l], 0x20 if char == " " else 0x41)
             self.content[self.cur_line] = l[:self.col] + char + l[self.col:]
             self.col += len(char)
+        elif key == KEY_PASTE: ## insert pasted text at once, with a single undo record
+            self.mark = None
+            ni = self.col
+            t = char.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+            t[0] = l[:ni] + t[0]
+            t = [printable(expandtabs(i)) for i in t]
+            self.undo_add(self.cur_line, [l], KEY_NONE, len(t))
+            self.col = len(t[-1])
+            t[-1] += l[ni:]
+            self.content[self.cur_line:self.cur_line + 1] = t
+            self.shift_add(self.cur_line + 1, len(t) - 1)
+            self.total_lines += len(t) - 1
+            self.cur_line += len(t) - 1
         elif key == KEY_HOME:
             ni = self.spaces(l)
             self.col = ni if self.col != ni else 0
         elif key == KEY_END:
             self.col = len(l)
         elif key == KEY_PGUP:
-            self.cur_line -= Editor.height
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() - Editor.height)
+            else:
+                self.cur_line -= Editor.height
         elif key == KEY_PGDN:
-            self.cur_line += Editor.height
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() + Editor.height)
+            else:
+                self.cur_line += Editor.height
         elif key == KEY_FIND:
             pat = self.line_edit("Find: ", Editor.find_pattern)
             if pat:
@@ -543,34 +1577,66 @@ class Editor:
         elif key == KEY_LAST: ## last line
             self.cur_line = self.total_lines - 1
             self.row = Editor.height - 1 ## will be fixed if required
-        elif key == KEY_TOGGLE: ## Toggle Autoindent/Search case/ Tab Size, TAB write
-            pat = self.line_edit("Autoindent {}, Case Sensitive Search {}"
-            ", Tab Size {}, Write Tabs {}: ".format(
-            self.autoindent, Editor.case, self.tab_size, self.write_tabs), "")
+        elif key == KEY_TOGGLE: ## Toggle Autoindent/Search case/ Tab Size, TAB write, Syntax
+            pat = self.line_edit("Autoindent {}, Case {}" ## fits 80 columns with room for all fields
+            ", Tab Size {}, Write Tabs {}, Syntax {}, Wrap {}: ".format(
+            self.autoindent, Editor.case, self.tab_size, self.write_tabs, self.syntax, self.wrap), "")
             try:
                 res =  [i.strip().lower() for i in pat.split(",")]
+                if self.readonly and any(res[4:6]): ## a file view: no lexer states or wrap index of all lines
+                    self.message = "Read only"
+                    res[4:6] = ["", ""]
                 if res[0]: self.autoindent = 'y' if res[0][0] == 'y' else 'n'
                 if res[1]: Editor.case     = 'y' if res[1][0] == 'y' else 'n'
                 if res[2]: self.tab_size = int(res[2])
                 if res[3]: self.write_tabs = 'y' if res[3][0] == 'y' else 'n'
+                if res[4]: self.syntax = 'y' if res[4][0] == 'y' else 'n'
+                if res[5]:
+                    self.wrap = res[5][0] if res[5][0] in "yl" else 'n'
+                    self.wtree, self.top_sub = None, 0
             except:
                 pass
-        elif key == KEY_MOUSE: ## Set Cursor
-            if char[1] < Editor.height:
-                self.col = char[0] + self.margin
-                self.cur_line = char[1] + self.top_line
-                if char[2] in (0x22, 0x30): ## Right/Ctrl button on Mouse
+            self.touch(0) ## syntax and wrap are shared, a second view must be shown anew too
+        elif key == KEY_MOUSE: ## Set Cursor, mark lines by dragging
+            y, b = char[1] - Editor.ytop, char[2] ## row in the pane, button
+            if b & 0x23 >= 3: ## drag or release, may leave the pane
+                y = min(max(y, 0), Editor.height - 1)
+            if 0 <= y < Editor.height:
+                if self.wrap == "y":
+                    self.wrap_goto(self.wrap_row() - self.row + y, char[0])
+                else:
+                    i = min(y + self.top_line, self.total_lines - 1)
+                    m = 0 if self.wrap == "l" and i != self.cur_line else self.margin ## wrap mode l: unscrolled
+                    self.cur_line = i
+                    self.col = self.sidx(self.content[i], char[0] + m)
+                if b in (2, 16): ## Right/Ctrl button on Mouse
                     self.mark = self.cur_line if self.mark is None else None
+                elif b == 0: ## left press, a drag may follow
+                    self.drag = self.cur_line
+                elif self.drag is not None and b & 32: ## dragged, mark from the start line
+                    if self.cur_line != self.drag:
+                        self.mark = min(self.drag, self.total_lines - 1)
+                elif b & 3 == 3: ## release
+                    self.drag = None
+        elif key in (KEY_SCRLUP, KEY_SCRLDN) and self.wrap == "y":
+            c = self.wrap_row()
+            t = c - self.row
+            if key == KEY_SCRLUP:
+                t = max(t - 3 * char, 0)
+            elif t + Editor.height < self.wrap_prefix(self.total_lines):
+                t = min(t + 3 * char, self.wrap_prefix(self.total_lines) - 1)
+            self.top_line, self.top_sub = self.wrap_find(t)
+            c = min(max(c, t), t + Editor.height - 1) ## keep the cursor in the window
+            self.wrap_goto(c)
+            self.row = c - t
         elif key == KEY_SCRLUP: ##
             if self.top_line > 0:
-                self.top_line = max(self.top_line - 3, 0)
+                self.top_line = max(self.top_line - 3 * char, 0)
                 self.cur_line = min(self.cur_line, self.top_line + Editor.height - 1)
-                self.scroll_up(3)
         elif key == KEY_SCRLDN: ##
             if self.top_line + Editor.height < self.total_lines:
-                self.top_line = min(self.top_line + 3, self.total_lines - 1)
+                self.top_line = min(self.top_line + 3 * char, self.total_lines - 1)
                 self.cur_line = max(self.cur_line, self.top_line)
-                self.scroll_down(3)
         elif key == KEY_MATCH:
             if self.col < len(l): ## ony within text
                 opening = "([{<"
@@ -621,6 +1687,7 @@ class Editor:
                 ni = min(self.spaces(l), self.col)  ## query indentation
             self.cur_line += 1
             self.content[self.cur_line:self.cur_line] = [' ' * ni + l[self.col:]]
+            self.shift_add(self.cur_line, 1)
             self.total_lines += 1
             self.col = ni
         elif key == KEY_TAB:
@@ -670,8 +1737,8 @@ class Editor:
                             if q != 'a':
                                 self.display_window()
                                 key, char = self.get_input()  ## Get Char of Fct.
-                                q = char.lower()
-                            if q == 'q' or key == KEY_QUIT:
+                                q = char.lower() if type(char) is str else "" ## mouse: no
+                            if q == 'q' or key in (KEY_QUIT, KEY_ESC):
                                 break
                             elif q in ('a','y'):
                                 self.undo_add(self.cur_line, [self.content[self.cur_line]], KEY_NONE)
@@ -698,6 +1765,7 @@ class Editor:
                     self.delete_lines(False)
                 self.undo_add(self.cur_line, None, KEY_NONE, -len(Editor.yank_buffer))
                 self.content[self.cur_line:self.cur_line] = Editor.yank_buffer # insert lines
+                self.shift_add(self.cur_line, len(Editor.yank_buffer))
                 self.total_lines += len(Editor.yank_buffer)
         elif key == KEY_WRITE:
             fname = self.line_edit("Save File: ", self.fname)
@@ -709,6 +1777,9 @@ class Editor:
         elif key == KEY_UNDO:
             if len(self.undo) > 0:
                 action = self.undo.pop(-1) ## get action from stack
+                self.drag = None ## lines may move
+                self.lvalid = min(self.lvalid, action[0])
+                self.touch(action[0])
                 if not action[3] in (KEY_INDENT, KEY_UNDENT):
                     self.cur_line = action[0] ## wrong for Bkspc of BOL
                 self.col = action[4]
@@ -717,8 +1788,12 @@ class Editor:
                         self.content[action[0]:action[0] + action[1]] = action[2] # insert lines
                     else:
                         self.content += action[2]
+                    if self.wtree is not None: ## lines replaced; shift_add tells lines inserted
+                        self.wtouch.update(range(action[0], action[0] + min(action[1], len(action[2]))))
+                    self.shift_add(action[0] + min(action[1], len(action[2])), len(action[2]) - action[1])
                 else: ## delete lines
                     del self.content[action[0]:action[0] - action[1]]
+                    self.shift_add(action[0], action[1])
                 self.total_lines = len(self.content) ## brute force
                 if len(self.undo) == self.undo_zero:
                     self.changed = ''
@@ -726,30 +1801,62 @@ class Editor:
         elif key == KEY_REDRAW:
             self.redraw(True)
 
-    def edit_loop(self): ## main editing loop
+    def edit_loop(self, full = True): ## main editing loop, full: redraw the screen first
         if not self.content: ## ensure content
             self.content = [""]
         self.total_lines = len(self.content)
-        self.redraw(self.message == "")
+        self.drag = None ## a drag does not go on in another pane or buffer
+        if full:
+            self.redraw(self.message == "")
 
         while True:
-            self.display_window()  ## Update & display window
+            if self.pending(): ## more keys waiting, e.g. paste or key repeat: update later
+                self.align_window()
+            else:
+                if Editor.other:
+                    self.show_other()
+                self.display_window()  ## Update & display window
+            self.message = '' ## clear message, get_input may set a new one
+            while self.loader and not self.pending(): ## read on until a key is typed
+                m, n = self.message, self.total_lines
+                self.load(LOAD_LINES)
+                if self.message != m or n < self.top_line + Editor.height: ## a new percentage, or lines shown
+                    self.display_window()
             key, char = self.get_input()  ## Get Char of Fct-key code
-            self.message = '' ## clear message
+            if Editor.stats: ## the output of the previous key is complete
+                self.stats_next(key)
+            if self.gline >= 0 and key not in Editor.GAP_KEYS:
+                self.gap_close() ## the line may be used or changed
+            if self.loader and key in Editor.LOAD_KEYS:
+                self.load(END_LINE)
+            if self.readonly and key in Editor.EDIT_KEYS:
+                self.message = "Read only"
+                continue
 
             if key == KEY_QUIT:
-                if self.changed:
+                if self.changed and not self.twin: ## no other view of the content stays
                     res = self.line_edit("Content changed! Quit without saving (y/N)? ", "N")
                     if not res or res[0].upper() != 'Y':
                         continue
                 self.scroll_region(0)
                 self.mouse_reporting(False) ## disable mouse reporting
+                self.wr('\x1b[?2004l') ## disable bracketed paste
                 self.goto(Editor.height, 0)
                 self.clear_to_eol()
-                self.undo = []
+                self.flush()
+                if not self.twin: ## the other view keeps the undo list and goes on loading
+                    self.undo = []
+                    if self.loader:
+                        self.loader.close()
+                        self.loader = None
+                    if self.readonly: ## the file a FileLines reads from
+                        self.content.f.close()
                 return key
-            elif key in (KEY_NEXT, KEY_GET):
+            elif key in (KEY_NEXT, KEY_GET, KEY_SPLIT):
                 return key
+            elif (key == KEY_MOUSE and Editor.other and char[2] & 0x23 < 3 and
+                  not 0 <= char[1] - Editor.ytop <= Editor.height):
+                return KEY_NEXT ## a click into the other pane moves there
             else:
                 self.handle_edit_keys(key, char)
 
@@ -773,19 +1880,50 @@ class Editor:
             fname = self.line_edit("Open file: ", "")
         if fname:
             self.fname = fname
+            self.syntax = 'y' if fname.endswith(".py") else 'n'
+            self.lvalid = 0
+            self.wtree = None
             if fname in ('.', '..') or (stat(fname)[0] & 0x4000): ## Dir
                 self.content = ["Directory '{}'".format(fname), ""] + sorted(listdir(fname))
+            elif stat(fname)[6] > (gc.mem_free() >> 1 if is_micropython else VIEW_SIZE): ## too large to load
+                self.content = FileLines(fname)
+                self.syntax = self.write_tabs = 'n'
+                self.readonly = True
+                self.message = "{} lines, read only".format(len(self.content))
             else:
                 if is_micropython:
-                    with open(fname) as f:
-                        self.content = f.readlines()
+                    self.loader = open(fname)
                 else:
-                    with open(fname, errors="ignore") as f:
-                        self.content = f.readlines()
-                Editor.tab_seen = 'n'
-                for i, l in enumerate(self.content):
-                    self.content[i] = expandtabs(l.rstrip('\r\n\t '))
-                self.write_tabs = Editor.tab_seen
+                    self.loader = open(fname, errors="ignore")
+                self.lsize = max(stat(fname)[6], 1)
+                self.content = []
+                self.write_tabs = 'n'
+                self.load(LOAD_LINES) ## the first screen, the rest is read between keys
+
+    def load(self, n): ## read up to n more lines of the file being opened
+        f, k = self.loader, len(self.content)
+        Editor.tab_seen = self.write_tabs
+        for _ in range(n):
+            l = f.readline()
+            if not l: ## all read
+                f.close()
+                self.loader = None
+                break
+            self.content.append(expandtabs(l.rstrip('\r\n\t ')))
+        self.write_tabs = Editor.tab_seen
+        self.total_lines = n = len(self.content)
+        self.touch(k) ## the new lines may be on the screen
+        t = self.wtree
+        if t is not None and len(t) == k and self.wwidth == Editor.width: ## extend the wrap index
+            t += [self.line_rows(self.content[i]) for i in range(k, n)]
+        if self.loader:
+            self.message = "Loading {}%".format(divmod(f.tell() * 100, self.lsize)[0])
+        else:
+            self.message = ""
+#ifdef LINUX
+            if is_linux and n > BIG_FILE: ## a list would move too many lines at each insert
+                self.content = LineTree(self.content)
+#endif
 
 ## write file
     def put_file(self, fname):
@@ -803,6 +1941,365 @@ class Editor:
             pass
         rename(tmpfile, fname)
 
+## The lines of a large file, in chunks of up to CHUNK_LINES lines. A Fenwick tree of
+## the chunk sizes finds a line, so inserting or deleting moves a chunk only. It does
+## what the editor does with the list of lines: index, slice, del, pop and +=.
+## The boards cannot load files that large, there it is the base of RowTree only.
+class LineTree:
+    CHUNK = CHUNK_LINES
+
+    def __init__(self, lines):
+        h = self.CHUNK >> 1
+        self.chunks = [lines[i:i + h] for i in range(0, len(lines), h)] or [[]]
+        self.index()
+
+    @staticmethod
+    def fenwick(v): ## Fenwick tree of the values v, t[0] unused
+        n = len(v)
+        t = [0] + v
+        for j in range(1, n + 1):
+            k = j + (j & -j)
+            if k <= n:
+                t[k] += t[j]
+        return t
+
+    def index(self): ## count the lines and build the tree, after chunks were added or removed
+        n = len(self.chunks)
+        t = self.fenwick([len(c) for c in self.chunks])
+        self.tree, self.size, self.top = t, sum(len(c) for c in self.chunks), 1
+        while self.top * 2 <= n:
+            self.top *= 2
+        self.last = (0, 0, 0) ## chunk, first and end line of the chunk found last
+
+    def find(self, i): ## chunk and index in it of line i, the end of the last chunk for i == size
+        k, a, b = self.last
+        if a <= i < b:
+            return k, i - a
+        t, k, m, j = self.tree, 0, self.top, i
+        while m:
+            if k + m < len(t) and t[k + m] <= j:
+                k += m
+                j -= t[k]
+            m >>= 1
+        if k == len(self.chunks):
+            k -= 1
+            j = len(self.chunks[k])
+        self.last = (k, i - j, i - j + len(self.chunks[k]))
+        return k, j
+
+    def update(self, k, d): ## chunk k got d lines more
+        self.size += d
+        k += 1
+        while k < len(self.tree):
+            self.tree[k] += d
+            k += k & -k
+        self.last = (0, 0, 0)
+
+    def replace(self, a, b, lines): ## replace the lines a to b - 1 by lines
+        k, j = self.find(a)
+        c = self.chunks[k]
+        if b - a <= len(c) - j: ## within a chunk
+            c[j:j + b - a] = lines
+            if 0 < len(c) <= self.CHUNK:
+                self.update(k, len(lines) - b + a)
+                return
+            m = k
+        else:
+            m, i = self.find(b)
+            c = c[:j] + lines + self.chunks[m][i:]
+        h = self.CHUNK >> 1 ## split into half full chunks, or drop an empty one
+        self.chunks[k:m + 1] = [c[i:i + h] for i in range(0, len(c), h)]
+        if not self.chunks:
+            self.chunks = [[]]
+        self.index()
+
+    def range(self, s): ## first and end line of the slice s
+        a = 0 if s.start is None else min(s.start, self.size)
+        return a, max(a, self.size if s.stop is None else min(s.stop, self.size))
+
+    def __len__(self):
+        return self.size
+
+#ifdef LINUX
+    def __iter__(self): ## the methods for the lines of a file, which a RowTree does not use
+        for c in self.chunks:
+            for l in c:
+                yield l
+
+    def pop(self, i):
+        l = self[i]
+        self.replace(i, i + 1, [])
+        return l
+
+#endif
+    def __getitem__(self, i):
+        if type(i) is slice:
+            a, b = self.range(i)
+            r = []
+            while a < b:
+                k, j = self.find(a)
+                c = self.chunks[k][j:j + b - a]
+                r += c
+                a += len(c)
+            return r
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError
+        k, j = self.find(i)
+        return self.chunks[k][j]
+
+    def __setitem__(self, i, l):
+        if type(i) is slice:
+            a, b = self.range(i)
+            self.replace(a, b, l)
+        else:
+            k, j = self.find(i + self.size if i < 0 else i)
+            self.chunks[k][j] = l
+
+    def __delitem__(self, i):
+        a, b = self.range(i) if type(i) is slice else (i, i + 1)
+        self.replace(a, b, [])
+
+    def __iadd__(self, lines):
+        self.replace(self.size, self.size, lines)
+        return self
+
+## The wrap index: the screen rows of each line, in the chunks of a LineTree, with a
+## second Fenwick tree of the rows per chunk. Inserting or deleting lines moves a chunk.
+class RowTree(LineTree):
+    CHUNK = WRAP_CHUNK
+
+    def index(self):
+        LineTree.index(self)
+        self.rtree = self.fenwick([sum(c) for c in self.chunks])
+
+    def add(self, k, d): ## chunk k got d rows more
+        k += 1
+        while k < len(self.rtree):
+            self.rtree[k] += d
+            k += k & -k
+
+    def replace(self, a, b, rows):
+        k, t = self.find(a)[0], self.rtree
+        d = sum(rows) - sum(self[a:b])
+        LineTree.replace(self, a, b, rows)
+        if self.rtree is t: ## no chunk split or dropped, which builds the trees again
+            self.add(k, d)
+
+    def __setitem__(self, i, v):
+        if type(i) is slice:
+            LineTree.__setitem__(self, i, v)
+        else:
+            k, j = self.find(i)
+            self.add(k, v - self.chunks[k][j])
+            self.chunks[k][j] = v
+
+    def rows(self, i): ## rows of the lines before line i
+        k, j = self.find(i)
+        s, c = 0, self.chunks[k]
+        for x in range(j):
+            s += c[x]
+        while k > 0:
+            s += self.rtree[k]
+            k &= k - 1
+        return s
+
+    def find_row(self, r): ## line and row in it of the screen row r, line size if beyond
+        t, k, m = self.rtree, 0, self.top
+        while m:
+            if k + m < len(t) and t[k + m] <= r:
+                k += m
+                r -= t[k]
+            m >>= 1
+        i, j = 0, k ## the lines of the chunks before k
+        while j > 0:
+            i += self.tree[j]
+            j &= j - 1
+        if k < len(self.chunks):
+            for v in self.chunks[k]:
+                if r < v:
+                    break
+                r -= v
+                i += 1
+        return i, r
+
+## The lines of a file too large for the memory, read from the file when needed.
+## An index made in one pass holds the offset of every VIEW_STEP-th line; the
+## lines of a few of these blocks are kept.
+class FileLines:
+    def __init__(self, fname):
+        self.f = open(fname, "rb")
+        self.index, n, last = [0], 0, 0
+        if is_micropython: ## scan the file in blocks, as bytes: a bytearray has no find()
+            base = 0
+            while True:
+                b = self.f.read(VIEW_BUF)
+                if not b:
+                    break
+                i = b.find(b"\n")
+                while i >= 0:
+                    n += 1
+                    last = base + i + 1
+                    if n % VIEW_STEP == 0:
+                        self.index.append(last)
+                    i = b.find(b"\n", i + 1)
+                base += len(b)
+            end = base
+        else: ## let the OS page the file in
+            import mmap
+            m = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+            i = m.find(b"\n")
+            while i >= 0:
+                n += 1
+                last = i + 1
+                if n % VIEW_STEP == 0:
+                    self.index.append(last)
+                i = m.find(b"\n", last)
+            end = len(m)
+            m.close()
+        self.size = n + (end > last) ## a last line without newline
+        self.blocks = {} ## block number: lines
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if type(i) is slice:
+            return [self[j] for j in range(i.start or 0, self.size if i.stop is None else min(i.stop, self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("line")
+        b, i = divmod(i, VIEW_STEP)
+        if b not in self.blocks:
+            if len(self.blocks) >= 4:
+                self.blocks = {}
+            self.blocks[b] = self.read(b)
+        return self.blocks[b][i]
+
+    def read(self, b): ## the lines of block b
+        self.f.seek(self.index[b])
+        r = []
+        for _ in range(min(VIEW_STEP, self.size - b * VIEW_STEP)):
+            l = self.f.readline()
+            try:
+                l = l.decode()
+            except:
+                l = "".join(chr(c) if c < 0x80 else "?" for c in l)
+            r.append(expandtabs(l.rstrip('\r\n\t ')))
+        return r
+
+## the chars of a keymap file entry: \e for ESC, \xNN, and \\ for a backslash
+def unescape(s):
+    r, i = [], 0
+    while i < len(s):
+        c = s[i]
+        if c == "\\" and i + 1 < len(s):
+            i += 1
+            c = s[i]
+            if c == "e":
+                c = "\x1b"
+            elif c == "x":
+                c = chr(int(s[i + 1:i + 3], 16))
+                i += 2
+        r.append(c)
+        i += 1
+    return "".join(r)
+
+## first and last index + 1 in i..j where the screen string a differs from b, for update_line;
+## a as shifted by d chars fill inserted (d > 0) or d chars deleted (d < 0) at p <= i
+def cmp_head(a, b, i, j, p=0, d=0, fill=" "):
+    while i < j and i < p + d and b[i] == fill:
+        i += 1
+    if i < p + d:
+        return i
+    while i < j and i - d < len(a) and a[i - d] == b[i]:
+        i += 1
+    return i
+
+def cmp_tail(a, b, i, j, p=0, d=0, fill=" "):
+    if j > len(a) + d:
+        return j
+    while j > i and j > p + d and a[j - 1 - d] == b[j - 1]:
+        j -= 1
+    while j > i and j > p and j <= p + d and b[j - 1] == fill:
+        j -= 1
+    return j
+
+def same8(a, i, b, j): ## a[i:i + 8] == b[j:j + 8], without the slices
+    k = max(min(8, len(a) - i), 0)
+    if k != max(min(8, len(b) - j), 0):
+        return False
+    while k > 0 and a[i + k - 1] == b[j + k - 1]:
+        k -= 1
+    return k == 0
+
+POW10 = (1000000000, 100000000, 10000000, 1000000, 100000, 10000, 1000, 100, 10, 1)
+
+def ndigits(n): ## number of decimal digits of n >= 0
+    k = 1
+    while k < 10 and n >= POW10[9 - k]:
+        k += 1
+    return k
+
+## screen cells of the chars which do not take exactly one: (first, last, cells), sorted
+WIDTHS = (
+    (0x0300, 0x036f, 0), (0x0483, 0x0489, 0), (0x0591, 0x05bd, 0), (0x0610, 0x061a, 0),
+    (0x064b, 0x065f, 0), (0x0670, 0x0670, 0), (0x06d6, 0x06dc, 0), (0x0e31, 0x0e31, 0),
+    (0x0e34, 0x0e3a, 0), (0x0e47, 0x0e4e, 0), (0x1100, 0x115f, 2), (0x1ab0, 0x1aff, 0),
+    (0x1dc0, 0x1dff, 0), (0x200b, 0x200f, 0), (0x20d0, 0x20ff, 0), (0x2e80, 0x303e, 2),
+    (0x3041, 0x33ff, 2), (0x3400, 0x4dbf, 2), (0x4e00, 0x9fff, 2), (0xa000, 0xa4cf, 2),
+    (0xac00, 0xd7a3, 2), (0xf900, 0xfaff, 2), (0xfe00, 0xfe0f, 0), (0xfe20, 0xfe2f, 0),
+    (0xfe30, 0xfe4f, 2), (0xff00, 0xff60, 2), (0xffe0, 0xffe6, 2), (0x1f300, 0x1f64f, 2),
+    (0x1f900, 0x1f9ff, 2), (0x20000, 0x2fffd, 2), (0x30000, 0x3fffd, 2), (0xe0100, 0xe01ef, 0))
+
+try:
+    isascii = str.isascii ## only ASCII chars, so one cell each
+except AttributeError:
+    def isascii(s):
+        return s == "" or max(s) < "\x80"
+
+def char_width(c): ## screen cells of the char c
+    c = ord(c)
+    if c < 0x300:
+        return 1
+    i, j = 0, len(WIDTHS)
+    while i < j: ## first range ending at or above c
+        m = (i + j) >> 1
+        if WIDTHS[m][1] < c:
+            i = m + 1
+        else:
+            j = m
+    return WIDTHS[i][2] if i < len(WIDTHS) and WIDTHS[i][0] <= c else 1
+
+def str_width(s):
+    return len(s) if isascii(s) else sum(char_width(c) for c in s)
+
+def is_wide(s): ## any char in s not taking exactly one cell
+    return not isascii(s) and any(char_width(c) != 1 for c in s)
+
+def lower_bound(a, x): ## first index in the sorted sequence a with a[i] >= x
+    i, j = 0, len(a)
+    while i < j:
+        m = (i + j) >> 1
+        if a[m] < x:
+            i = m + 1
+        else:
+            j = m
+    return i
+
+## printable: s without control chars and DEL, which typed keys do not insert either
+def printable(s):
+    for c in s:
+        if c < " " or c == "\x7f":
+            return "".join(c for c in s if " " <= c != "\x7f")
+    return s
+
 ## expandtabs: hopefully sometimes replaced by the built-in function
 def expandtabs(s):
     if '\t' in s:
@@ -820,9 +2317,19 @@ def expandtabs(s):
     else:
         return s
 
-def pye(*content, tab_size=4, undo=50, device=0):
+def pye(*content, tab_size=4, undo=50, device=0, stats=False, baud=0, keymap=None):
 ## prepare content
     gc.collect() ## all (memory) is mine
+    Editor.baud = baud
+    if stats: ## count the output
+        Editor.stats, Editor.fstats, Editor.lstats = [0] * 6, [0] * 6, [0] * 6
+        if is_micropython:
+            Editor.heap = gc.mem_alloc()
+#ifdef LINUX
+        if type(stats) == str: ## and log it per key to that file
+            Editor.stats_file = open(stats, "w")
+            Editor.stats_file.write("key bytes writes frames repainted skipped heap\n")
+#endif
     slot = [Editor(tab_size, undo)]
     index = 0
     if content:
@@ -837,27 +2344,82 @@ def pye(*content, tab_size=4, undo=50, device=0):
             elif type(f) == list and len(f) > 0 and type(f[0]) == str:
                 slot[index].content = f ## non-empty list of strings -> edit
             index += 1
+    if keymap: ## keys of this terminal, or of the user
+        try:
+            Editor.load_keys(keymap)
+        except Exception as err:
+            slot[0].message = "Keymap {}: {!r}".format(keymap, err)
+    Editor.key_tree()
 ## edit
     Editor.init_tty(device)
+    full = True
     while True:
         try:
             index %= len(slot)
-            key = slot[index].edit_loop()  ## edit buffer
+            e = slot[index]
+            key = e.edit_loop(full)  ## edit buffer
+            full = True
+            if e.twin: ## the other view of this content follows
+                e.share(e.twin)
+            p = Editor.other
+## In split screen an editor in slot may have a second view, shown in the other pane.
+## That view is not in slot, the one in slot is hidden or in the pane with the focus.
             if key == KEY_QUIT:
-                if len(slot) == 1: ## the last man standing is kept
+                if p: ## close the pane, the other one gets the screen
+                    o, Editor.other = p["editor"], None
+                    if o.twin: ## a second view takes the place of the first
+                        slot[slot.index(o.twin)], o.twin.twin, o.twin = o, None, None
+                    if o.content is not e.content:
+                        del slot[index]
+                    index = slot.index(o)
+                elif len(slot) == 1: ## the last man standing is kept
                     break
-                del slot[index]
+                else:
+                    del slot[index]
             elif key == KEY_GET:
                 slot.append(Editor(tab_size, undo))
                 index = len(slot) - 1
                 slot[index].get_file(None)
+            elif key == KEY_SPLIT:
+                if p: ## back to one pane, a second view shown in the other is dropped
+                    if p["editor"].twin:
+                        p["editor"].twin.twin = None
+                    Editor.other = None
+                else: ## the next buffer in the lower pane, or a second view of this one
+                    o = slot[(index + 1) % len(slot)]
+                    o.content = o.content or [""] ## as edit_loop does
+                    o.total_lines = len(o.content)
+                    Editor.other = {"editor": e.view() if o is e else o, "ytop": 1,
+                        "height": 0, "scrbuf": [], "rows": [], "scrtop": 0, "shifts": [],
+                        "sview": None, "smark": (0, 0), "shl": [-1, 0]}
             elif key == KEY_NEXT:
-                index += 1
+                if p: ## move the focus to the other pane, without a redraw
+                    o = p["editor"]
+                    if o.twin: ## a second view comes into slot
+                        b = o.twin
+                        slot[slot.index(b)] = o
+                        if b is not e: ## the first one was hidden, drop it
+                            o.twin = b.twin = None
+                    p["editor"] = e
+                    e.swap_pane()
+                    index = slot.index(o)
+                    full = False
+                else:
+                    index += 1
         except Exception as err:
             slot[index].message = "{!r}".format(err)
 ## All windows closed, clean up
     Editor.deinit_tty()
     Editor.yank_buffer = []
+    if Editor.stats:
+        slot[0].stats_next(KEY_NONE)
+#ifdef LINUX
+        if Editor.stats_file:
+            Editor.stats_file.write("total {} {} {} {} {} {}\n".format(*Editor.stats))
+            Editor.stats_file.close()
+            Editor.stats_file = None
+#endif
+        Editor.stats = None
 ## close
     return slot[0].content if (slot[0].fname == "") else slot[0].fname
 
@@ -868,7 +2430,7 @@ if __name__ == "__main__":
         fd_tty = 0
         if len(sys.argv) > 1:
             name = sys.argv[1:]
-            pye(*name, undo=500, device=fd_tty)
+            pye(*name, undo=500, device=fd_tty, stats=os.getenv("PYE_STATS"), keymap=os.getenv("PYE_KEYS"))
         else:
             name = ""
             if not is_micropython:
@@ -879,7 +2441,7 @@ if __name__ == "__main__":
                     fd_tty = os.open("/dev/tty", os.O_RDONLY) ## memorized, if new fd
                     for i, l in enumerate(name):  ## strip and convert
                         name[i] = expandtabs(l.rstrip('\r\n\t '))
-            pye(name, undo=500, device=fd_tty)
+            pye(name, undo=500, device=fd_tty, stats=os.getenv("PYE_STATS"), keymap=os.getenv("PYE_KEYS"))
     else:
         print ("\nSorry, this OS is not supported (yet)")
 #endif
@@ -1,6 +1,6 @@
 import sys, gc
 if sys.platform in ("linux", "darwin"):
-    import os, signal, tty, termios
+    import os, signal, tty, termios, select
     const = lambda x:x
     is_linux = True
 else:
@@ -8,6 +8,7 @@ else:
 if sys.implementation.name == "micropython":
     is_micropython = True
     from uio import StringIO
+    from utime import ticks_ms, ticks_diff
 else:
     is_micropython = False
     from _io import StringIO
@@ -20,6 +21,7 @@ KEY_HOME = const(0x10)
 KEY_END = const(0x03)
 KEY_PGUP = const(0xfff1)
 KEY_PGDN = const(0xfff2)
+KEY_PASTE = const(0xfff3)
 KEY_QUIT = const(0x11)
 KEY_ENTER = const(0x0a)
 KEY_BACKSPACE = const(0x08)
@@ -48,22 +50,43 @@ KEY_NEXT = const(0x17)
 KEY_MATCH = const(0xfffd)
 KEY_INDENT = const(0xfffe)
 KEY_UNDENT = const(0xffff)
+KEY_SPLIT = const(0xfff4)
+KEY_ESC = const(0xfff5)
+SLOW_BAUD = const(38400) 
+END_LINE = const(0x3fffffff) 
+FRAME_SIZE = const(2048) 
+INPUT_SIZE = const(256) 
+ESC_TIME = const(100) 
+GAP_LINE = const(256) 
+CHUNK_LINES = const(512) 
+WRAP_CHUNK = const(64) 
+LOAD_LINES = const(256) 
+VIEW_SIZE = const(0x4000000) 
+VIEW_STEP = const(64) 
+VIEW_BUF = const(4096) 
 class Editor:
     KEYMAP = { 
     "\x1b[A" : KEY_UP,
     "\x1b[B" : KEY_DOWN,
     "\x1b[D" : KEY_LEFT,
     "\x1b[C" : KEY_RIGHT,
+    "\x1bOA" : KEY_UP, 
+    "\x1bOB" : KEY_DOWN,
+    "\x1bOD" : KEY_LEFT,
+    "\x1bOC" : KEY_RIGHT,
     "\x1b[H" : KEY_HOME, 
     "\x1bOH" : KEY_HOME, 
     "\x1b[1~": KEY_HOME, 
     "\x1b[F" : KEY_END, 
     "\x1bOF" : KEY_END, 
     "\x1b[4~": KEY_END, 
+    "\x1b[7~": KEY_HOME, 
+    "\x1b[8~": KEY_END, 
     "\x1b[5~": KEY_PGUP,
     "\x1b[6~": KEY_PGDN,
     "\x03" : KEY_DUP, 
     "\r" : KEY_ENTER,
+    "\x1bOM" : KEY_ENTER, 
     "\x7f" : KEY_BACKSPACE, 
     "\x1b[3~": KEY_DELETE,
     "\x1b[Z" : KEY_BACKTAB, 
@@ -89,13 +112,60 @@ class Editor:
     "\x01" : KEY_TOGGLE, 
     "\x17" : KEY_NEXT, 
     "\x0f" : KEY_GET, 
+    "\x10" : KEY_SPLIT, 
     "\x1b[1;5H": KEY_FIRST, 
     "\x1b[1;5F": KEY_LAST, 
     "\x1b[3;5~": KEY_YANK, 
     "\x0b" : KEY_MATCH,
     "\x1b[M" : KEY_MOUSE,
+    "\x1b[<" : KEY_MOUSE, 
+    "\x1b[200~": KEY_PASTE, 
     }
+    ktree = None 
+    kback = None 
+    GAP_KEYS = (KEY_NONE, KEY_LEFT, KEY_RIGHT, KEY_BACKSPACE, KEY_DELETE) 
+    LOAD_KEYS = (KEY_WRITE, KEY_FIND, KEY_FIND_AGAIN, KEY_REPLC, KEY_LAST, KEY_GOTO,
+        KEY_MATCH) 
+    EDIT_KEYS = (KEY_NONE, KEY_PASTE, KEY_ENTER, KEY_BACKSPACE, KEY_DELETE, KEY_TAB, KEY_BACKTAB,
+        KEY_YANK, KEY_ZAP, KEY_REPLC, KEY_UNDO, KEY_WRITE) 
+    KEYWORDS = set(("False", "None", "True", "and", "as", "assert", "async",
+        "await", "break", "class", "continue", "def", "del", "elif", "else",
+        "except", "finally", "for", "from", "global", "if", "import", "in",
+        "is", "lambda", "nonlocal", "not", "or", "pass", "raise", "return",
+        "try", "while", "with", "yield", "self"))
+    COLORS = {".": b"\x1b[22;39m", "k": b"\x1b[1;34m", "s": b"\x1b[22;32m",
+        "c": b"\x1b[22;36m", "n": b"\x1b[22;35m"}
+    lexcache = {} 
     yank_buffer = []
+    fbuf = bytearray(FRAME_SIZE) 
+    fview = memoryview(fbuf)
+    flen = 0 
+    ibuf = bytearray(INPUT_SIZE) 
+    iview = memoryview(ibuf)
+    ipos = ilen = 0 
+    sname = ("", b"", 0) 
+    cpos = [-1, 0] 
+    scrtop = 0 
+    shifts = [] 
+    sview = None 
+    smark = (0, 0) 
+    shl = [-1, 0] 
+    cmaps = {} 
+    stats = None 
+    fstats = lstats = None 
+    skey = KEY_NONE 
+    heap = 0 
+    caps = None 
+    baud = 0 
+    rate = 0 
+    rbytes = rtime = 0 
+    ytop = 0 
+    other = None 
+    region = -1 
+    PANE = ("ytop", "height", "scrbuf", "rows", "scrtop", "shifts", "sview", "smark", "shl")
+    DOC = ("content", "total_lines", "undo", "undo_zero", "undo_limit", "changed", "fname", "lstate",
+           "lvalid", "syntax", "wrap", "autoindent", "write_tabs", "tab_size", "wtree", "wtouch",
+           "wwidth", "readonly", "loader", "lsize") 
     find_pattern = ""
     case = "n"
     replc_pattern = ""
@@ -110,12 +180,48 @@ class Editor:
         self.undo_zero = 0
         self.autoindent = "y"
         self.mark = None
+        self.drag = None 
         self.write_tabs = "n"
+        self.syntax = "n"
+        self.lstate = bytearray() 
+        self.lvalid = 0 
+        self.wrap = "n" 
+        self.hline = 0 
+        self.readonly = False 
+        self.loader = None 
+        self.lsize = 1 
+        self.gline = -1 
+        self.gbuf = self.gview = None
+        self.gs = self.ge = 0 
+        self.gsync = True 
+        self.top_sub = 0 
+        self.wtree = None 
+        self.wtouch = set() 
+        self.dirty = (0, 0) 
+        self.twin = None 
     if is_micropython and not is_linux:
-        def wr(self, s):
-            sys.stdout.write(s)
-        def rd(self):
-            return sys.stdin.read(1)
+        def send(self, b): 
+            if Editor.stats:
+                Editor.fstats[0] += len(b)
+                Editor.fstats[1] += 1
+            t = ticks_ms()
+            sys.stdout.write(b) 
+            Editor.rbytes += len(b) 
+            Editor.rtime += ticks_diff(ticks_ms(), t)
+            if Editor.rbytes > 500: 
+                Editor.rate = int(Editor.rbytes * 10000 / max(Editor.rtime, 1))
+                Editor.rbytes = Editor.rtime = 0
+        def rd_raw(self, b): 
+            if Editor.sany: 
+                return Editor.sin.readinto(b, min(max(Editor.sany(), 1), len(b)))
+            n = Editor.sin.readinto(b, 1) 
+            while n < len(b) and self.waiting():
+                n += Editor.sin.readinto(b[n:], 1)
+            return n
+        def waiting(self, ms=0): 
+            if Editor.poller:
+                return bool(Editor.poller.poll(ms))
+            return ms > 0 
         @staticmethod
         def init_tty(device):
             try:
@@ -123,6 +229,21 @@ class Editor:
                 kbd_intr(-1)
             except ImportError:
                 pass
+            Editor.sin = getattr(sys.stdin, "buffer", sys.stdin) 
+            Editor.sany = getattr(Editor.sin, "any", None) 
+            if Editor.sany is None:
+                try:
+                    from pyb import USB_VCP
+                    if USB_VCP().isconnected(): 
+                        Editor.sany = USB_VCP().any
+                except:
+                    pass
+            try:
+                from uselect import poll
+                Editor.poller = poll()
+                Editor.poller.register(sys.stdin, 1) 
+            except:
+                Editor.poller = None 
         @staticmethod
         def deinit_tty():
             try:
@@ -130,120 +251,804 @@ class Editor:
                 kbd_intr(3)
             except ImportError:
                 pass
-    def goto(self, row, col):
-        self.wr("\x1b[{};{}H".format(row + 1, col + 1))
+    def rd(self): 
+        while True:
+            p, n = Editor.ipos, Editor.ilen
+            if p < n:
+                c = Editor.ibuf[p]
+                if c < 0x80:
+                    Editor.ipos = p + 1
+                    return chr(c)
+                k = 1 if c < 0xc0 else 2 if c < 0xe0 else 3 if c < 0xf0 else 4 
+                if p + k <= n:
+                    Editor.ipos = p + k
+                    try:
+                        return bytes(Editor.iview[p:p + k]).decode("UTF-8")
+                    except:
+                        continue 
+                Editor.ibuf[:n - p] = Editor.ibuf[p:n] 
+                n -= p
+            else:
+                n = 0
+            Editor.ipos, Editor.ilen = 0, n
+            k = self.rd_raw(Editor.iview[n:])
+            if k is None: 
+                return chr(KEY_REDRAW)
+            Editor.ilen = n + k
+    def pending(self, ms=0): 
+        return Editor.kback is not None or Editor.ipos < Editor.ilen or self.waiting(ms)
+    def flush(self): 
+        if Editor.flen:
+            n, Editor.flen = Editor.flen, 0
+            self.send(Editor.fview[:n])
+    def wr(self, s): 
+        if type(s) is str:
+            s = s.encode()
+        n = Editor.flen
+        if n + len(s) > FRAME_SIZE: 
+            self.flush()
+            if len(s) > FRAME_SIZE:
+                self.send(s)
+                return
+            n = 0
+        Editor.fbuf[n:n + len(s)] = s
+        Editor.flen = n + len(s)
+    def num(self, n): 
+        if Editor.flen + 10 > FRAME_SIZE:
+            self.flush()
+        b, k = Editor.fbuf, Editor.flen
+        for p in POW10:
+            if n >= p or p == 1 or k > Editor.flen: 
+                d = 48
+                while n >= p:
+                    n -= p
+                    d += 1
+                b[k] = d
+                k += 1
+        Editor.flen = k
+    def rpt(self, c, n): 
+        if Editor.flen + n > FRAME_SIZE:
+            self.flush()
+        for i in range(Editor.flen, Editor.flen + n):
+            Editor.fbuf[i] = c
+        Editor.flen += n
+    def csi(self, n, f): 
+        self.wr(b"\x1b[")
+        self.num(n)
+        self.wr(f)
+    def goto(self, row, col): 
+        r, c = Editor.cpos
+        Editor.cpos[0], Editor.cpos[1] = row, col
+        if r == row and c == col:
+            return
+        n = 3 + ndigits(row + 1) + (1 + ndigits(col + 1) if col else 0) 
+        if r >= 0 and (r < Editor.height) == (row < Editor.height):
+            d, e = row - r, col - c
+            m = ((d if is_linux and d < 3 else 3 + ndigits(d)) if d > 0 else
+                 2 if d == -1 else 3 + ndigits(-d) if d < 0 else 0)
+            m += (1 if col == 0 else -e if -4 < e < 0 else
+                  3 + ndigits(-e) if e < 0 else 3 + ndigits(e) if e > 0 else 0)
+            if m < n: 
+                if d > 0:
+                    if is_linux and d < 3: 
+                        self.rpt(10, d)
+                    else:
+                        self.csi(d, b"B")
+                elif d == -1:
+                    self.wr(b"\x1bM") 
+                elif d < 0:
+                    self.csi(-d, b"A")
+                if col == 0:
+                    self.wr(b"\r")
+                elif -4 < e < 0:
+                    self.rpt(8, -e)
+                elif e < 0:
+                    self.csi(-e, b"D")
+                elif e > 0:
+                    self.csi(e, b"C")
+                return
+        self.wr(b"\x1b[")
+        self.num(Editor.ytop + row + 1)
+        if col:
+            self.wr(b";")
+            self.num(col + 1)
+        self.wr(b"H")
+    def put(self, s): 
+        self.wr(self.pack(s) if len(s) > 7 and Editor.caps else s)
+        Editor.cpos[1] += len(s) if isascii(s) else str_width(s)
+        if Editor.cpos[1] >= Editor.width: 
+            Editor.cpos[0] = -1
+    def pack(self, s): 
+        rep, res, i, j = "b" in Editor.caps, [], 0, 0
+        while j < len(s):
+            c, k = s[j], j + 1
+            while k < len(s) and s[k] == c:
+                k += 1
+            if k - j > 7 and " " <= c < "\x7f":
+                if rep:
+                    res.append(s[i:j + 1])
+                    res.append("\x1b[{}b".format(k - j - 1))
+                    i = k
+                elif c == " " and k - j > 11 and "X" in Editor.caps: 
+                    res.append(s[i:j])
+                    res.append("\x1b[{0}X\x1b[{0}C".format(k - j))
+                    i = k
+            j = k
+        if i == 0:
+            return s
+        res.append(s[i:])
+        return "".join(res)
     def clear_to_eol(self):
-        self.wr("\x1b[0K")
+        self.wr(b"\x1b[K")
     def cursor(self, onoff):
-        self.wr("\x1b[?25h" if onoff else "\x1b[?25l")
+        self.wr(b"\x1b[?25h" if onoff else b"\x1b[?25l")
     def hilite(self, mode):
         if mode == 1: 
-            self.wr("\x1b[1;47m")
+            self.wr(b"\x1b[1;47m")
         elif mode == 2: 
-            self.wr("\x1b[43m")
+            self.wr(b"\x1b[43m")
         else: 
-            self.wr("\x1b[0m")
+            self.wr(b"\x1b[0m")
     def mouse_reporting(self, onoff):
-        self.wr('\x1b[?9h' if onoff else '\x1b[?9l') 
+        
+        self.wr('\x1b[?1000h\x1b[?1002h\x1b[?1006h' if onoff else '\x1b[?1006l\x1b[?1002l\x1b[?1000l')
     def scroll_region(self, stop):
-        self.wr('\x1b[1;{}r'.format(stop) if stop else '\x1b[r') 
-    def scroll_up(self, scrolling):
+        self.wr('\x1b[{};{}r'.format(Editor.ytop + 1, Editor.ytop + stop) if stop else '\x1b[r') 
+        Editor.region = Editor.ytop if stop else -1
+        Editor.cpos[0] = -1 
+    def pane_region(self): 
+        if Editor.region != Editor.ytop:
+            self.scroll_region(Editor.height)
+    def scroll_up(self, scrolling): 
+        self.pane_region()
         Editor.scrbuf[scrolling:] = Editor.scrbuf[:-scrolling]
-        Editor.scrbuf[:scrolling] = [''] * scrolling
-        self.goto(0, 0)
-        self.wr("\x1bM" * scrolling)
-    def scroll_down(self, scrolling):
+        Editor.scrbuf[:scrolling] = [(False,'','')] * scrolling
+        if scrolling > 1 and "S" in Editor.caps:
+            self.csi(scrolling, b"T") 
+        else:
+            self.goto(0, 0)
+            for i in range(scrolling):
+                self.wr(b"\x1bM") 
+        Editor.scrtop -= scrolling
+    def scroll_down(self, scrolling): 
+        self.pane_region()
         Editor.scrbuf[:-scrolling] = Editor.scrbuf[scrolling:]
-        Editor.scrbuf[-scrolling:] = [''] * scrolling
-        self.goto(Editor.height - 1, 0)
-        self.wr("\x1bD " * scrolling)
+        Editor.scrbuf[-scrolling:] = [(False,'','')] * scrolling
+        if scrolling > 1 and "S" in Editor.caps:
+            self.csi(scrolling, b"S") 
+        else:
+            self.goto(Editor.height - 1, 0)
+            for i in range(scrolling):
+                self.wr(b"\x1bD") 
+        Editor.scrtop += scrolling
+    def shift_rows(self, lnum, n): 
+        row = lnum - Editor.scrtop
+        if row < 0: 
+            if n > 0 or row - n <= 0: 
+                Editor.scrtop += n
+                return
+            Editor.scrtop, n, row = lnum, n - row, 0
+        if row < Editor.height:
+            n = min(n, Editor.height - row) if n > 0 else max(n, row - Editor.height)
+            if n > 0:
+                Editor.scrbuf[row:row] = [(False,'','')] * n
+                del Editor.scrbuf[Editor.height:]
+            else:
+                del Editor.scrbuf[row:row - n]
+                Editor.scrbuf += [(False,'','')] * -n
+            self.pane_region()
+            self.goto(row, 0)
+            self.csi(abs(n), b"L" if n > 0 else b"M")
     def get_screen_size(self):
+        probe = Editor.caps is None
+        if probe: 
+            self.wr('\x1b[c\x1b[Hx\x1b[2b\x1b[6n')
         self.wr('\x1b[999;999H\x1b[6n')
+        Editor.cpos[0] = -1
+        self.flush()
         pos = ''
-        char = self.rd() 
-        while char != 'R':
-            pos += char
-            char = self.rd()
-        return [int(i, 10) for i in pos.lstrip("\n\x1b[").split(';')]
+        while pos.count('R') < 1 + probe: 
+            pos += self.rd()
+        pos = pos.split('\x1b[')
+        size = [i for i in pos if i[-1:] == 'R']
+        if probe:
+            da = [i for i in pos if i[:1] == '?' and i[-1:] == 'c'] + ['?0c']
+            try:
+                level = int(da[0][1:-1].split(';')[0]) 
+            except:
+                level = 0
+            Editor.caps = (("L" if level == 6 or level >= 62 else "") + ("X" if level >= 62 else "") +
+                           ("S" if level >= 64 else "") + ("b" if size[0] == "1;4R" else ""))
+        return [int(i, 10) for i in size[-1][:-1].split(';')]
     def redraw(self, flag):
         self.cursor(False)
         Editor.height, Editor.width = self.get_screen_size()
-        Editor.height -= 1
-        Editor.scrbuf = [(False,"\x00")] * Editor.height 
+        Editor.ytop, Editor.height = 0, Editor.height - 1
+        if Editor.other: 
+            p, h = Editor.other, (Editor.height - 1) >> 1
+            if p["ytop"]: 
+                p["ytop"], p["height"], Editor.height = h + 1, Editor.height - h - 1, h
+            else:
+                p["height"], Editor.ytop, Editor.height = h, h + 1, Editor.height - h - 1
+            p["editor"].row = min(p["height"] - 1, p["editor"].row)
+            self.swap_pane()
+            self.clear_pane()
+            self.swap_pane()
+        self.clear_pane()
         self.row = min(Editor.height - 1, self.row)
         self.scroll_region(Editor.height)
         self.mouse_reporting(True) 
+        self.wr('\x1b[?2004h') 
         if is_micropython:
             gc.collect()
             if flag:
                 self.message = "{} Bytes Memory available".format(gc.mem_free())
+        if flag and Editor.stats:
+            self.message = ("Out {}B {}W {}F rows {}/{} heap {}, last key {}B {}W {}F rows {}/{} heap {}  ".format(
+                *(Editor.stats + Editor.lstats)) + self.message)
+    def clear_pane(self): 
+        Editor.scrbuf = [(False,"\x00" * Editor.width,'')] * Editor.height 
+        Editor.rows = Editor.scrbuf[:] 
+        Editor.sview = None
+        Editor.shifts = []
+        Editor.shl = [-1, 0]
+    def swap_pane(self): 
+        p = Editor.other
+        for k in Editor.PANE:
+            v = getattr(Editor, k)
+            setattr(Editor, k, p[k])
+            p[k] = v
+        Editor.cpos[0] = -1 
+    def show_other(self): 
+        e = Editor.other["editor"]
+        if e.twin is self:
+            self.gap_sync()
+            self.share(e)
+        if e.dirty[0] < e.dirty[1] or Editor.other["sview"] is None:
+            self.swap_pane()
+            e.display_window(False)
+            self.swap_pane()
+    def share(self, e): 
+        for k in Editor.DOC:
+            setattr(e, k, getattr(self, k, None))
+    def view(self): 
+        e = Editor(self.tab_size, self.undo_limit)
+        self.share(e)
+        e.top_line, e.cur_line, e.col, e.row = self.top_line, self.cur_line, self.col, self.row
+        e.twin, self.twin = self, e
+        return e
+    def stats_next(self, key): 
+        if is_micropython: 
+            Editor.fstats[5] = gc.mem_alloc() - Editor.heap
+            gc.collect()
+            Editor.heap = gc.mem_alloc()
+        for i in range(6):
+            Editor.stats[i] += Editor.fstats[i]
+        Editor.lstats, Editor.fstats, Editor.skey = Editor.fstats, [0] * 6, key
+    @staticmethod
+    def key_tree(): 
+        t = {"": ""}
+        for seq in sorted(Editor.KEYMAP, key=len):
+            n = t
+            for i in range(len(seq) - 1):
+                m = n.get(seq[i])
+                if m is None:
+                    m = n[seq[i]] = {"": seq[:i + 1]} 
+                elif type(m) is int: 
+                    break
+                n = m
+            else:
+                n[seq[-1]] = Editor.KEYMAP[seq]
+        Editor.ktree = t
+        return t
+    @staticmethod
+    def load_keys(fname): 
+        with open(fname) as f:
+            for l in f:
+                l = l.split()
+                if len(l) == 2 and l[0][0] != "\x23": 
+                    Editor.KEYMAP[unescape(l[0])] = Editor.KEYMAP[unescape(l[1])]
+        Editor.ktree = None
     def get_input(self): 
+        self.flush() 
+        if Editor.kback is not None:
+            key, Editor.kback = Editor.kback, None
+            return key
+        key, char = self.get_key()
+        if key in (KEY_SCRLUP, KEY_SCRLDN):
+            while self.pending():
+                k = self.get_key()
+                if k[0] != key:
+                    Editor.kback = k
+                    break
+                char += 1
+        return key, char
+    def get_key(self): 
+        tree = Editor.ktree or self.key_tree()
         while True:
-            in_buffer = self.rd()
-            if in_buffer == '\x1b': 
+            c = self.rd()
+            k = tree.get(c)
+            if k is None: 
+                if c >= " ":
+                    return KEY_NONE, c
+                continue
+            if c == "\x1b" and not self.pending(ESC_TIME): 
+                return KEY_ESC, ""
+            p, m = None, ""
+            while type(k) is dict: 
+                c = self.rd()
+                if c == ";" and p is None: 
+                    p = k
+                n = k.get(c)
+                if n is None and p: 
+                    m = c
+                    while c < "@":
+                        c = self.rd()
+                        m += c
+                    n = p.get(c)
+                    if n is None and p[""] == "\x1b[1": 
+                        n = tree["\x1b"]["["].get(c)
+                if n is None: 
+                    m = k[""] + (m or c)
+                    if len(k[""]) > 1: 
+                        while " " <= c < "@":
+                            c = self.rd()
+                            m += c
+                    self.message = "Unknown key {!r}".format(m)
+                    return KEY_NONE, ""
+                k = n
+            if k == KEY_PASTE: 
+                in_buffer = []
                 while True:
-                    in_buffer += self.rd()
-                    c = in_buffer[-1]
-                    if c == '~' or (c.isalpha() and c != 'O'):
-                        break
-            if in_buffer in self.KEYMAP:
-                c = self.KEYMAP[in_buffer]
-                if c != KEY_MOUSE:
-                    return c, ""
+                    in_buffer.append(self.rd())
+                    if in_buffer[-1] == '~' and "".join(in_buffer[-6:]) == "\x1b[201~":
+                        return KEY_PASTE, "".join(in_buffer[:-6])
+            elif k != KEY_MOUSE:
+                return k, ""
+            else: 
+                if c == "<": 
+                    p, i = [0, 0, 0], 0
+                    while True:
+                        c = self.rd()
+                        if c == ";":
+                            i = min(i + 1, 2)
+                        elif "0" <= c <= "9":
+                            p[i] = p[i] * 10 + ord(c) - 48
+                        else:
+                            break
+                    b, x, y = p[0] if c == "M" else p[0] | 3, p[1] - 1, p[2] - 1
                 else: 
-                    mouse_fct = ord((self.rd())) 
-                    mouse_x = ord(self.rd()) - 33
-                    mouse_y = ord(self.rd()) - 33
-                    if mouse_fct == 0x61:
-                        return KEY_SCRLDN, ""
-                    elif mouse_fct == 0x60:
-                        return KEY_SCRLUP, ""
-                    else:
-                        return KEY_MOUSE, [mouse_x, mouse_y, mouse_fct] 
-            elif ord(in_buffer[0]) >= 32:
-                return KEY_NONE, in_buffer
-    def display_window(self): 
+                    b = ord(self.rd()) - 32
+                    x = ord(self.rd()) - 33
+                    y = ord(self.rd()) - 33
+                if b & 64: 
+                    return (KEY_SCRLDN if b & 1 else KEY_SCRLUP), 1
+                return KEY_MOUSE, [x, y, b] 
+    def align_window(self): 
         self.cur_line = min(self.total_lines - 1, max(self.cur_line, 0))
-        self.col = max(0, min(self.col, len(self.content[self.cur_line])))
-        if self.col >= Editor.width + self.margin:
-            self.margin = self.col - Editor.width + (Editor.width >> 2)
-        elif self.col < self.margin:
-            self.margin = max(self.col - (Editor.width >> 2), 0)
+        if self.gline != self.cur_line:
+            l = self.content[self.cur_line]
+            n = len(l)
+        else: 
+            l, n = "", self.gap_len()
+        self.col = max(0, min(self.col, n))
+        if not isascii(l):
+            while 0 < self.col < len(l) and char_width(l[self.col]) == 0:
+                self.col -= 1 
+        if self.wrap == "y": 
+            self.margin = 0
+            c = self.wrap_row()
+            t = self.wrap_prefix(min(self.top_line, self.total_lines)) + self.top_sub
+            if not (t <= c < t + Editor.height):
+                t = max(c - self.row, 0)
+            self.top_line, self.top_sub = self.wrap_find(t)
+            self.row = c - t
+            return t
+        w = Editor.width
+        if self.wrap == "l": 
+            if self.hline != self.cur_line: 
+                self.margin, self.hline = 0, self.cur_line
+            w -= 1
+        c = self.scol(l, self.col)
+        if (self.scol(l, self.col + 1) if self.col < n else c + 1) > w + self.margin:
+            self.margin = c - w + (w >> 2)
+        elif c < self.margin + (self.wrap == "l"):
+            self.margin = max(c - (w >> 2), 0)
         if not (self.top_line <= self.cur_line < self.top_line + Editor.height): 
             self.top_line = max(self.cur_line - self.row, 0)
         self.row = self.cur_line - self.top_line
+        return self.top_line
+    def cmap(self, l): 
+        if isascii(l):
+            return None
+        try:
+            return Editor.cmaps[l]
+        except KeyError:
+            pass
+        m, c, k = [0], 0, 0
+        for ch in l:
+            w = char_width(ch)
+            c += w
+            k += w != 1
+            m.append(c)
+        if len(Editor.cmaps) > 4 * Editor.height: 
+            Editor.cmaps.clear()
+        Editor.cmaps[l] = m = m if k else None
+        return m
+    def scol(self, l, i): 
+        m = self.cmap(l)
+        return i if m is None else m[i]
+    def sidx(self, l, c): 
+        m = self.cmap(l)
+        if m is None:
+            return c
+        i = lower_bound(m, c)
+        while i < len(l) and m[i + 1] == m[i]: 
+            i += 1
+        return i
+    def cells(self, l, c, w): 
+        m = self.cmap(l)
+        if m is None:
+            return c, c + w, 0
+        a = min(lower_bound(m, c), len(l))
+        while 0 < a < len(l) and m[a + 1] == m[a]: 
+            a += 1
+        return a, lower_bound(m, c + w + 1) - 1, m[a] - c
+    def wrap_starts(self, l): 
+        m = self.cmap(l)
+        if m is None:
+            return range(0, len(l) + 1, Editor.width)
+        s, r = 0, [0]
+        while m[-1] - m[s] >= Editor.width: 
+            s = max(lower_bound(m, m[s] + Editor.width + 1) - 1, s + 1)
+            r.append(s)
+        return r
+    def wrap_pos(self): 
+        l = self.content[self.cur_line]
+        if isascii(l):
+            return divmod(self.col, Editor.width)
+        r = self.wrap_starts(l)
+        k = lower_bound(r, self.col + 1) - 1
+        return k, self.scol(l, self.col) - self.scol(l, r[k])
+    def wrap_sync(self): 
+        n = self.total_lines
+        if self.wtree is None or len(self.wtree) != n or self.wwidth != Editor.width:
+            self.wwidth = Editor.width
+            self.wtree = RowTree([self.line_rows(l) for l in self.content])
+            self.touch(0) 
+        else:
+            t = self.wtree
+            for i in self.wtouch:
+                if i < n:
+                    d = self.line_rows(self.content[i])
+                    if d != t[i]: 
+                        t[i] = d
+                        self.touch(i + 1)
+        self.wtouch.clear()
+    def line_rows(self, l): 
+        return divmod(len(l), Editor.width)[0] + 1 if isascii(l) else len(self.wrap_starts(l))
+    def wrap_prefix(self, i): 
+        return self.wtree.rows(i)
+    def wrap_find(self, r): 
+        i, r = self.wtree.find_row(r)
+        if i >= self.total_lines: 
+            i = self.total_lines - 1
+            r = self.line_rows(self.content[i]) - 1
+        return i, r
+    def wrap_row(self): 
+        self.wrap_sync()
+        return self.wrap_prefix(self.cur_line) + self.wrap_pos()[0]
+    def wrap_goto(self, r, c=None): 
+        if c is None:
+            c = self.wrap_pos()[1]
+        self.cur_line, k = self.wrap_find(max(r, 0))
+        l = self.content[self.cur_line]
+        r = self.wrap_starts(l)
+        self.col = min(self.sidx(l, self.scol(l, r[k]) + c), r[k + 1] - 1 if k + 1 < len(r) else len(l))
+    def display_window(self, focus = True): 
+        top = self.align_window()
         self.cursor(False)
-        i = self.top_line
+        if self.wrap != "y" and "L" in Editor.caps: 
+            for i in Editor.shifts:
+                self.shift_rows(*i)
+        del Editor.shifts[:]
+        i = top - Editor.scrtop
+        fa = fb = 0 
+        if 0 < i < Editor.height:
+            self.scroll_down(i)
+            fa, fb = Editor.height - i, Editor.height
+        elif 0 < -i < Editor.height:
+            self.scroll_up(-i)
+            fb = -i
+        elif i:
+            Editor.sview = None
+        Editor.scrtop = top
+        view = (self.margin if self.wrap == "n" else 0) * 8 + (self.syntax == "y") * 4 + "nyl".find(self.wrap)
+        full, Editor.sview = Editor.sview != view, view
+        lo, hi = self.dirty
+        self.dirty = (0, 0)
+        if self.syntax == "y" and lo < self.top_line:
+            hi = END_LINE 
+        m = self.line_range() if self.mark is not None else (0, 0)
+        ma, mb = Editor.smark
+        if ma == mb:
+            ma = mb = m[0]
+        Editor.smark = m
+        ha = hb = -1 
+        if self.wrap == "l" and (Editor.shl[0] != (self.cur_line if self.margin else -1) or
+                                 Editor.shl[1] != self.margin):
+            ha, hb = Editor.shl[0], self.cur_line
+            Editor.shl[0], Editor.shl[1] = hb if self.margin else -1, self.margin
+        i, s, rows = self.top_line, self.top_sub, Editor.rows
         for c in range(Editor.height):
             if i == self.total_lines: 
-                if Editor.scrbuf[c] != (False,''):
-                    self.goto(c, 0)
-                    self.clear_to_eol()
-                    Editor.scrbuf[c] = (False,'')
+                rows[c] = (False, '', '')
+                continue
+            l = self.content[i] if i != self.gline else "" 
+            d = self.dirty 
+            if not (full or lo <= i < hi or d[0] <= i < d[1] or fa <= c < fb or min(ma, m[0]) <= i < max(ma, m[0]) or
+                    min(mb, m[1]) <= i < max(mb, m[1]) or i == ha or i == hb):
+                n = self.line_rows(l) if self.wrap == "y" else 1
+                rows[c] = Editor.scrbuf[c] 
+            else:
+                if self.wrap == "y":
+                    r = self.wrap_starts(l)
+                    n = len(r)
+                    a, b, pad = r[s], r[s + 1] if s + 1 < n else len(l), 0
+                else:
+                    n = 1
+                    mg = self.margin if self.wrap == "n" or i == self.cur_line else 0
+                    a, b, pad = self.cells(l, mg, Editor.width)
+                    right = b < (self.gap_len() if i == self.gline else len(l))
+                    cut = self.wrap == "l" and (mg > 0 or right)
+                    if i == self.gline: 
+                        l, a, b = self.gap_text(a, b), 0, b - a
+                l = (m[0] <= i < m[1], l[a:b], self.line_attrs(i)[a:b] if self.syntax == "y" else "")
+                if pad > 0: 
+                    l = (l[0], " " * pad + l[1], "." * pad + l[2] if l[2] else "")
+                if self.wrap == "l" and cut:
+                    l = self.cut_marks(l, mg > 0, right)
+                rows[c] = l
+            if s + 1 < n:
+                s += 1 
             else:
-                l = (self.mark is not None and (
-                    (self.mark <= i <= self.cur_line) or (self.cur_line <= i <= self.mark)),
-                     self.content[i][self.margin:self.margin + Editor.width])
-                if l != Editor.scrbuf[c]: 
-                    self.goto(c, 0)
-                    if l[0]:
-                        self.hilite(2)
-                    self.wr(l[1])
-                    if len(l[1]) < Editor.width:
-                        self.clear_to_eol()
-                    if l[0]:
-                        self.hilite(0)
-                    Editor.scrbuf[c] = l
                 i += 1
+                s = 0
+        self.dirty = (0, 0) 
+        slow = 0 < (Editor.baud or Editor.rate) <= SLOW_BAUD
+        if slow: 
+            order = [self.row]
+            for i in range(1, Editor.height):
+                if self.row - i >= 0:
+                    order.append(self.row - i)
+                if self.row + i < Editor.height:
+                    order.append(self.row + i)
+        c = Editor.height 
+        while c > 0 and rows[c - 1] == (False, '', ''):
+            c -= 1
+        n = 0
+        for i in range(c, Editor.height):
+            if Editor.scrbuf[i] != rows[i]:
+                n += 1
+        if n > 1 and not (Editor.other and Editor.other["ytop"] > Editor.ytop): 
+            self.goto(c, 0)
+            self.wr(b"\x1b[J") 
+            for i in range(c, Editor.height):
+                Editor.scrbuf[i] = rows[i]
+        n = 0
+        for c in range(Editor.height):
+            if slow:
+                c = order[c]
+            l = rows[c]
+            if l != Editor.scrbuf[c]: 
+                self.update_line(c, Editor.scrbuf[c], l)
+                Editor.scrbuf[c] = l
+                n += 1
+            if slow:
+                if c == self.row:
+                    self.status_line()
+                if Editor.flen:
+                    self.flush()
+                    if self.pending(): 
+                        Editor.sview = None
+                        break
+        if Editor.stats: 
+            f = Editor.fstats
+            f[2], f[3], f[4] = f[2] + 1, f[3] + n, f[4] + Editor.height - n
+        if not slow:
+            self.status_line()
+        if focus:
+            self.goto(self.row, (self.wrap_pos()[1] if self.wrap == "y" else self.col if self.gline == self.cur_line
+                                 else self.scol(self.content[self.cur_line], self.col)) - self.margin)
+            self.cursor(True)
+            self.flush()
+    def cut_marks(self, row, left, right): 
+        mk, t, at = row
+        if right:
+            w = str_width(t)
+            while w > Editor.width - 1:
+                w -= char_width(t[-1])
+                t, at = t[:-1], at[:-1]
+            t, at = t + ">", at and at + "."
+        if left and t:
+            k = 1
+            while k < len(t) and char_width(t[k]) == 0: 
+                k += 1
+            g = " " * (char_width(t[0]) - 1) 
+            t, at = "<" + g + t[k:], at and "." * (1 + len(g)) + at[k:]
+        return (mk, t, at)
+    def status_line(self): 
         self.goto(Editor.height, 0)
         self.hilite(1)
-        self.wr("{}{} Row: {}/{} Col: {}  {}".format(
-            self.changed, self.fname, self.cur_line + 1, self.total_lines,
-            self.col + 1, self.message)[:self.width - 1])
+        if Editor.sname[0] is not self.fname: 
+            Editor.sname = (self.fname, self.fname.encode(), str_width(self.fname))
+        w = (len(self.changed) + Editor.sname[2] + 15 + ndigits(self.cur_line + 1) +
+             ndigits(self.total_lines) + ndigits(self.col + 1))
+        if w + len(self.message) < Editor.width: 
+            if self.changed:
+                self.wr(b"*")
+            self.wr(Editor.sname[1])
+            self.wr(b" Row: ")
+            self.num(self.cur_line + 1)
+            self.wr(b"/")
+            self.num(self.total_lines)
+            self.wr(b" Col: ")
+            self.num(self.col + 1)
+            self.wr(b"  ")
+            Editor.cpos[1] = w
+            if self.message:
+                self.put(self.message)
+        else:
+            self.put("{}{} Row: {}/{} Col: {}  {}".format(
+                self.changed, self.fname, self.cur_line + 1, self.total_lines,
+                self.col + 1, self.message)[:self.width - 1])
         self.clear_to_eol() 
         self.hilite(0)
-        self.goto(self.row, self.col - self.margin)
-        self.cursor(True)
+    def update_line(self, row, old, new): 
+        o, n, oa, na = old[1], new[1], old[2], new[2]
+        if old[0] != new[0] or (o and (oa == "") != (na == "")):
+            o = "\x00" * Editor.width 
+        p = cmp_head(o, n, 0, len(n)) 
+        if na:
+            p = min(p, cmp_head(oa, na, 0, len(n)))
+        if is_wide(o) or is_wide(n): 
+            while p > 0 and ((p < len(n) and char_width(n[p]) == 0) or
+                             (p < len(o) and char_width(o[p]) == 0)):
+                p -= 1 
+            if new[0]:
+                self.hilite(2)
+            self.goto(row, str_width(n[:p]))
+            self.put_colored(n[p:], na[p:])
+            if str_width(o[p:]) > str_width(n[p:]):
+                self.clear_to_eol()
+            if new[0]:
+                self.hilite(0)
+            return
+        d, lim, w = 0, 8 if "L" in Editor.caps else 0, Editor.width
+        bc = END_LINE
+        while d <= lim:
+            if d == 0 or (len(o) > p - min(d, 0) and 
+                          same8(o, p - min(d, 0), n, p + max(d, 0))):
+                ls = min(len(o) + d, w) 
+                f = cmp_head(o, n, p, len(n), p, d, " ")
+                g = cmp_tail(o, n, f, len(n), p, d, " ")
+                if na: 
+                    fa = cmp_head(oa, na, p, len(n), p, d, ".")
+                    if fa < len(n):
+                        ga = cmp_tail(oa, na, fa, len(n), p, d, ".")
+                        if f == g:
+                            f, g = fa, ga
+                        else:
+                            f, g = min(f, fa), max(g, ga)
+                if f >= ls and not new[0]: 
+                    h = f
+                    while h < g and n[h] == " ":
+                        h += 1
+                    if h - f > 3:
+                        f = h
+                h = max(len(n), p + d) - d 
+                while h < min(len(o), w - d) and o[h] == " ":
+                    h += 1
+                el = h < min(len(o), w - d)
+                cost = g - f + 3 * el + ((3 + ndigits(abs(d)) + (6 if f > p else 0)) if d else 0) 
+                if cost < bc:
+                    bc, bd, bf, bg, bel = cost, d, f, g, el
+            d = -d if d > 0 else 1 - d 
+        d, f, g, el = bd, bf, bg, bel
+        if new[0]:
+            self.hilite(2)
+        if d:
+            self.goto(row, p)
+            self.wr(b"\x1b[")
+            self.num(abs(d))
+            self.wr(b"@" if d > 0 else b"P")
+        if f < g:
+            self.goto(row, f)
+            self.put_colored(n[f:g], na[f:g])
+        if el:
+            if g != len(n) or f == g:
+                self.goto(row, len(n))
+            self.clear_to_eol()
+        if new[0]:
+            self.hilite(0)
+    def put_colored(self, text, attrs): 
+        i, cur = 0, "."
+        while i < len(attrs):
+            j = i + 1
+            while j < len(attrs) and attrs[j] == attrs[i]:
+                j += 1
+            if attrs[i] != cur:
+                cur = attrs[i]
+                self.wr(Editor.COLORS[cur])
+            self.put(text[i:j])
+            i = j
+        if cur != ".":
+            self.wr(Editor.COLORS["."])
+        self.put(text[i:])
+    def lex(self, l, state, color): 
+        i, n, a = 0, len(l), []
+        if state:
+            i = l.find("'''" if state == 1 else '"""')
+            if i < 0:
+                return "s" * n, state
+            i += 3
+            state = 0
+            a.append("s" * i)
+        while i < n:
+            c = l[i]
+            j = i + 1
+            if c == "\x23": 
+                a.append("c" * (n - i))
+                break
+            elif c in "\'\"":
+                if l[i:i + 3] == c * 3: 
+                    j = l.find(c * 3, i + 3)
+                    if j < 0:
+                        a.append("s" * (n - i))
+                        return "".join(a), 1 if c == "\'" else 2
+                    j += 3
+                else:
+                    while j < n and l[j] != c:
+                        j += 2 if l[j] == "\\" else 1
+                    j = min(j + 1, n)
+                a.append("s" * (j - i))
+            elif not color:
+                a.append(".")
+            elif c.isalpha() or c == "_":
+                while j < n and (l[j].isalpha() or l[j].isdigit() or l[j] == "_"):
+                    j += 1
+                a.append(("k" if l[i:j] in Editor.KEYWORDS else ".") * (j - i))
+            elif c.isdigit():
+                while j < n and (l[j].isalpha() or l[j].isdigit() or l[j] == "."):
+                    j += 1
+                a.append("n" * (j - i))
+            else:
+                a.append(".")
+            i = j
+        return "".join(a) if color else None, state
+    def line_attrs(self, i): 
+        if len(self.lstate) < self.total_lines:
+            self.lstate.extend(bytearray(self.total_lines - len(self.lstate)))
+        while self.lvalid < i: 
+            l = self.content[self.lvalid]
+            self.set_state(self.lvalid, self.lex(l, self.lvalid and self.lstate[self.lvalid - 1],
+                False)[1] if ("\'" in l or '"' in l or self.lvalid and self.lstate[self.lvalid - 1]) else 0)
+            self.lvalid += 1
+        state, l = i and self.lstate[i - 1], self.content[i]
+        res = Editor.lexcache.get(l)
+        if res is None or res[0] != state:
+            if len(Editor.lexcache) > 4 * Editor.height:
+                Editor.lexcache.clear()
+            res = (state,) + self.lex(l, state, True)
+            Editor.lexcache[l] = res
+        if i == self.lvalid:
+            self.set_state(i, res[2])
+            self.lvalid += 1
+        return res[1]
+    def set_state(self, i, state): 
+        if self.lstate[i] != state:
+            self.lstate[i] = state
+            self.touch(i + 1, i + 2) 
     def spaces(self, line, pos = None): 
         return (len(line) - len(line.lstrip(" ")) if pos is None else 
                 len(line[:pos]) - len(line[:pos].rstrip(" ")))
@@ -251,32 +1056,35 @@ class Editor:
         return ((self.mark, self.cur_line + 1) if self.mark < self.cur_line else
                 (self.cur_line, self.mark + 1))
     def line_edit(self, prompt, default): 
-        push_msg = lambda msg: self.wr(msg + "\b" * len(msg)) 
+        def push_msg(msg): 
+            self.wr(msg)
+            self.rpt(8, str_width(msg))
         self.goto(Editor.height, 0)
+        Editor.cpos[0] = -1 
         self.hilite(1)
         self.wr(prompt)
-        self.wr(default)
+        res = default[:max(Editor.width - len(prompt) - 2, 0)] 
+        self.wr(res)
         self.clear_to_eol()
-        res = default
         pos = len(res)
         while True:
             key, char = self.get_input() 
             if key in (KEY_ENTER, KEY_TAB): 
                 self.hilite(0)
                 return res
-            elif key == KEY_QUIT: 
+            elif key in (KEY_QUIT, KEY_ESC): 
                 self.hilite(0)
                 return None
             elif key == KEY_LEFT:
                 if pos > 0:
-                    self.wr("\b")
                     pos -= 1
+                    self.rpt(8, char_width(res[pos]))
             elif key == KEY_RIGHT:
                 if pos < len(res):
                     self.wr(res[pos])
                     pos += 1
             elif key == KEY_HOME:
-                self.wr("\b" * pos)
+                self.rpt(8, str_width(res[:pos]))
                 pos = 0
             elif key == KEY_END:
                 self.wr(res[pos:])
@@ -287,20 +1095,23 @@ class Editor:
                     push_msg(res[pos:] + ' ') 
             elif key == KEY_BACKSPACE: 
                 if pos > 0:
+                    self.rpt(8, char_width(res[pos - 1]))
                     res = res[:pos-1] + res[pos:]
-                    self.wr("\b")
                     pos -= 1
                     push_msg(res[pos:] + ' ') 
             elif key == KEY_ZAP: 
                 if Editor.yank_buffer:
-                    self.wr('\b' * pos + ' ' * len(res) + '\b' * len(res))
+                    self.rpt(8, str_width(res[:pos]))
+                    self.rpt(32, str_width(res))
+                    self.rpt(8, str_width(res))
                     res = Editor.yank_buffer[0].strip()[:Editor.width - len(prompt) - 2]
                     self.wr(res)
                     pos = len(res)
-            elif key == KEY_NONE: 
-                if len(prompt) + len(res) < self.width - 2:
+            elif key in (KEY_NONE, KEY_PASTE): 
+                char = printable(char.split("\r")[0].split("\n")[0])[:self.width - 2 - len(prompt) - len(res)]
+                if char:
                     res = res[:pos] + char + res[pos:]
-                    self.wr(res[pos])
+                    self.wr(char)
                     pos += len(char)
                     push_msg(res[pos:]) 
     def find_in_file(self, pattern, col, end):
@@ -338,52 +1149,173 @@ class Editor:
             return None
     def undo_add(self, lnum, text, key, span = 1):
         self.changed = '*'
+        self.lvalid = min(self.lvalid, lnum) 
+        self.touch(lnum, lnum + span if text is not None and span == len(text) else END_LINE)
+        if self.wtree is not None: 
+            self.wtouch.update(range(lnum, lnum + (-span if text is None else max(span, len(text)))))
         if self.undo_limit > 0 and (
            len(self.undo) == 0 or key == KEY_NONE or self.undo[-1][3] != key or self.undo[-1][0] != lnum):
             if len(self.undo) >= self.undo_limit: 
                 del self.undo[0]
                 self.undo_zero -= 1
             self.undo.append([lnum, span, text, key, self.col])
+    def touch(self, lo, hi = END_LINE): 
+        e = self
+        while e: 
+            a, b = e.dirty
+            e.dirty = (lo, hi) if a >= b else (min(a, lo), max(b, hi))
+            e = e.twin if e is self else None
+    def shift_add(self, lnum, n): 
+        if n == 0:
+            return
+        if self.wtree is not None: 
+            if n > 0:
+                self.wtree[lnum:lnum] = [0] * n
+            else:
+                del self.wtree[lnum:lnum - n]
+            t = [i if i < lnum else i + n for i in self.wtouch if i < lnum or i >= lnum - n]
+            self.wtouch.clear() 
+            self.wtouch.update(t)
+            self.wtouch.update(range(lnum, lnum + n))
+        if Editor.shifts:
+            l, m = Editor.shifts[-1]
+            if (n > 0 and m > 0 and lnum == l + m) or (n < 0 and m < 0 and lnum == l):
+                Editor.shifts[-1] = (l, m + n) 
+                return
+        Editor.shifts.append((lnum, n))
     def delete_lines(self, yank): 
         lrange = self.line_range()
         if yank:
             Editor.yank_buffer = self.content[lrange[0]:lrange[1]]
         self.undo_add(lrange[0], self.content[lrange[0]:lrange[1]], KEY_NONE, 0) 
         del self.content[lrange[0]:lrange[1]]
-        if self.content == []: 
+        self.shift_add(lrange[0], lrange[0] - lrange[1])
+        if not self.content: 
             self.content = [""] 
             self.undo[-1][1] = 1 
         self.total_lines = len(self.content)
         self.cur_line = lrange[0]
-        self.mark = None 
+        self.mark = self.drag = None 
+    def gap_open(self):
+        l = self.content[self.cur_line]
+        if len(l) < GAP_LINE or self.syntax == "y" or self.wrap == "y" or not isascii(l):
+            return False
+        n = len(l)
+        self.gbuf = bytearray(n + GAP_LINE)
+        self.gview = memoryview(self.gbuf)
+        self.gview[:n] = l.encode()
+        self.gline, self.gs, self.ge, self.gsync = self.cur_line, n, n + GAP_LINE, True
+        return True
+    def gap_close(self):
+        if self.gline >= 0:
+            self.gap_sync()
+            self.gline, self.gbuf, self.gview = -1, None, None
+    def gap_sync(self): 
+        if not self.gsync:
+            n = self.gap_len()
+            self.gap_move(n)
+            self.content[self.gline] = str(self.gview[:n], "ascii")
+            self.gsync = True
+    def gap_len(self):
+        return len(self.gbuf) - self.ge + self.gs
+    def gap_move(self, c): 
+        s, e, v = self.gs, self.ge, self.gview
+        if c < s:
+            v[e - s + c:e] = v[c:s]
+        elif c > s:
+            v[s:c] = v[e:e + c - s]
+        self.gs, self.ge = c, e + c - s
+    def gap_text(self, a, b): 
+        s, d, v = self.gs, self.ge - self.gs, self.gview
+        b = min(b, len(self.gbuf) - d)
+        if b <= s:
+            return str(v[a:b], "ascii")
+        if a >= s:
+            return str(v[a + d:b + d], "ascii")
+        return str(v[a:s], "ascii") + str(v[s + d:b + d], "ascii")
+    def gap_undo(self, key): 
+        u = self.undo
+        if self.undo_limit > 0 and (not u or u[-1][3] != key or u[-1][0] != self.cur_line):
+            self.gap_sync() 
+        self.undo_add(self.cur_line, [self.content[self.cur_line]], key)
+        self.gsync = False
+    def gap_key(self, key, char): 
+        if key not in Editor.GAP_KEYS:
+            return False
+        if self.gline != self.cur_line:
+            if key in (KEY_LEFT, KEY_RIGHT):
+                return False
+            self.gap_close()
+            if not self.gap_open():
+                return False
+        c, n = self.col, self.gap_len()
+        if key == KEY_NONE:
+            if not "" < char < "\x80":
+                return False
+            self.mark = None
+            self.gap_undo(0x41) 
+            self.gap_move(c)
+            if self.gs == self.ge: 
+                g = max(GAP_LINE, n >> 3)
+                b = bytearray(n + g)
+                v = memoryview(b)
+                v[:c] = self.gview[:c]
+                v[c + g:] = self.gview[c:]
+                self.gbuf, self.gview, self.ge = b, v, c + g
+            self.gbuf[c] = ord(char)
+            self.gs, self.col = c + 1, c + 1
+        elif key == KEY_LEFT:
+            if c == 0:
+                return False
+            self.col = c - 1
+        elif key == KEY_RIGHT:
+            if c >= n:
+                return False
+            self.col = c + 1
+        elif self.mark is not None:
+            return False
+        elif key == KEY_BACKSPACE:
+            if c == 0:
+                return False
+            self.gap_undo(KEY_BACKSPACE)
+            self.gap_move(c)
+            self.gs, self.col = c - 1, c - 1
+        else: 
+            if c >= n:
+                return False
+            self.gap_undo(KEY_DELETE)
+            self.gap_move(c)
+            self.ge += 1
+        return True
     def handle_edit_keys(self, key, char): 
+        if self.gap_key(key, char):
+            return
+        self.gap_close()
         l = self.content[self.cur_line]
         if key == KEY_DOWN:
-            if self.cur_line < self.total_lines - 1:
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() + 1)
+            elif self.cur_line < self.total_lines - 1:
                 self.cur_line += 1
-                if self.cur_line == self.top_line + Editor.height:
-                    self.scroll_down(1)
         elif key == KEY_UP:
-            if self.cur_line > 0:
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() - 1)
+            elif self.cur_line > 0:
                 self.cur_line -= 1
-                if self.cur_line < self.top_line:
-                    self.scroll_up(1)
         elif key == KEY_LEFT:
             if self.col == 0 and self.cur_line > 0:
                 self.cur_line -= 1
                 self.col = len(self.content[self.cur_line])
-                if self.cur_line < self.top_line:
-                    self.scroll_up(1)
             else:
                 self.col -= 1
         elif key == KEY_RIGHT:
             if self.col >= len(l) and self.cur_line < self.total_lines - 1:
                 self.col = 0
                 self.cur_line += 1
-                if self.cur_line == self.top_line + Editor.height:
-                    self.scroll_down(1)
             else:
                 self.col += 1
+                while self.col < len(l) and char_width(l[self.col]) == 0:
+                    self.col += 1 
         elif key == KEY_DELETE:
             if self.mark is not None:
                 self.delete_lines(False)
@@ -393,6 +1325,7 @@ class Editor:
             elif (self.cur_line + 1) < self.total_lines: 
                 self.undo_add(self.cur_line, [l, self.content[self.cur_line + 1]], KEY_NONE)
                 self.content[self.cur_line] = l + self.content.pop(self.cur_line + 1)
+                self.shift_add(self.cur_line + 1, -1)
                 self.total_lines -= 1
         elif key == KEY_BACKSPACE:
             if self.mark is not None:
@@ -405,22 +1338,42 @@ class Editor:
                 self.undo_add(self.cur_line - 1, [self.content[self.cur_line - 1], l], KEY_NONE)
                 self.col = len(self.content[self.cur_line - 1])
                 self.content[self.cur_line - 1] += self.content.pop(self.cur_line)
+                self.shift_add(self.cur_line, -1)
                 self.cur_line -= 1
                 self.total_lines -= 1
-        elif key == KEY_NONE: 
+        elif key == KEY_NONE and char: 
             self.mark = None
             self.undo_add(self.cur_line, [l], 0x20 if char == " " else 0x41)
             self.content[self.cur_line] = l[:self.col] + char + l[self.col:]
             self.col += len(char)
+        elif key == KEY_PASTE: 
+            self.mark = None
+            ni = self.col
+            t = char.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+            t[0] = l[:ni] + t[0]
+            t = [printable(expandtabs(i)) for i in t]
+            self.undo_add(self.cur_line, [l], KEY_NONE, len(t))
+            self.col = len(t[-1])
+            t[-1] += l[ni:]
+            self.content[self.cur_line:self.cur_line + 1] = t
+            self.shift_add(self.cur_line + 1, len(t) - 1)
+            self.total_lines += len(t) - 1
+            self.cur_line += len(t) - 1
         elif key == KEY_HOME:
             ni = self.spaces(l)
             self.col = ni if self.col != ni else 0
         elif key == KEY_END:
             self.col = len(l)
         elif key == KEY_PGUP:
-            self.cur_line -= Editor.height
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() - Editor.height)
+            else:
+                self.cur_line -= Editor.height
         elif key == KEY_PGDN:
-            self.cur_line += Editor.height
+            if self.wrap == "y":
+                self.wrap_goto(self.wrap_row() + Editor.height)
+            else:
+                self.cur_line += Editor.height
         elif key == KEY_FIND:
             pat = self.line_edit("Find: ", Editor.find_pattern)
             if pat:
@@ -441,33 +1394,65 @@ class Editor:
             self.cur_line = self.total_lines - 1
             self.row = Editor.height - 1 
         elif key == KEY_TOGGLE: 
-            pat = self.line_edit("Autoindent {}, Case Sensitive Search {}"
-            ", Tab Size {}, Write Tabs {}: ".format(
-            self.autoindent, Editor.case, self.tab_size, self.write_tabs), "")
+            pat = self.line_edit("Autoindent {}, Case {}" 
+            ", Tab Size {}, Write Tabs {}, Syntax {}, Wrap {}: ".format(
+            self.autoindent, Editor.case, self.tab_size, self.write_tabs, self.syntax, self.wrap), "")
             try:
                 res = [i.strip().lower() for i in pat.split(",")]
+                if self.readonly and any(res[4:6]): 
+                    self.message = "Read only"
+                    res[4:6] = ["", ""]
                 if res[0]: self.autoindent = 'y' if res[0][0] == 'y' else 'n'
                 if res[1]: Editor.case = 'y' if res[1][0] == 'y' else 'n'
                 if res[2]: self.tab_size = int(res[2])
                 if res[3]: self.write_tabs = 'y' if res[3][0] == 'y' else 'n'
+                if res[4]: self.syntax = 'y' if res[4][0] == 'y' else 'n'
+                if res[5]:
+                    self.wrap = res[5][0] if res[5][0] in "yl" else 'n'
+                    self.wtree, self.top_sub = None, 0
             except:
                 pass
+            self.touch(0) 
         elif key == KEY_MOUSE: 
-            if char[1] < Editor.height:
-                self.col = char[0] + self.margin
-                self.cur_line = char[1] + self.top_line
-                if char[2] in (0x22, 0x30): 
+            y, b = char[1] - Editor.ytop, char[2] 
+            if b & 0x23 >= 3: 
+                y = min(max(y, 0), Editor.height - 1)
+            if 0 <= y < Editor.height:
+                if self.wrap == "y":
+                    self.wrap_goto(self.wrap_row() - self.row + y, char[0])
+                else:
+                    i = min(y + self.top_line, self.total_lines - 1)
+                    m = 0 if self.wrap == "l" and i != self.cur_line else self.margin 
+                    self.cur_line = i
+                    self.col = self.sidx(self.content[i], char[0] + m)
+                if b in (2, 16): 
                     self.mark = self.cur_line if self.mark is None else None
+                elif b == 0: 
+                    self.drag = self.cur_line
+                elif self.drag is not None and b & 32: 
+                    if self.cur_line != self.drag:
+                        self.mark = min(self.drag, self.total_lines - 1)
+                elif b & 3 == 3: 
+                    self.drag = None
+        elif key in (KEY_SCRLUP, KEY_SCRLDN) and self.wrap == "y":
+            c = self.wrap_row()
+            t = c - self.row
+            if key == KEY_SCRLUP:
+                t = max(t - 3 * char, 0)
+            elif t + Editor.height < self.wrap_prefix(self.total_lines):
+                t = min(t + 3 * char, self.wrap_prefix(self.total_lines) - 1)
+            self.top_line, self.top_sub = self.wrap_find(t)
+            c = min(max(c, t), t + Editor.height - 1) 
+            self.wrap_goto(c)
+            self.row = c - t
         elif key == KEY_SCRLUP: 
             if self.top_line > 0:
-                self.top_line = max(self.top_line - 3, 0)
+                self.top_line = max(self.top_line - 3 * char, 0)
                 self.cur_line = min(self.cur_line, self.top_line + Editor.height - 1)
-                self.scroll_up(3)
         elif key == KEY_SCRLDN: 
             if self.top_line + Editor.height < self.total_lines:
-                self.top_line = min(self.top_line + 3, self.total_lines - 1)
+                self.top_line = min(self.top_line + 3 * char, self.total_lines - 1)
                 self.cur_line = max(self.cur_line, self.top_line)
-                self.scroll_down(3)
         elif key == KEY_MATCH:
             if self.col < len(l): 
                 opening = "([{<"
@@ -518,6 +1503,7 @@ class Editor:
                 ni = min(self.spaces(l), self.col) 
             self.cur_line += 1
             self.content[self.cur_line:self.cur_line] = [' ' * ni + l[self.col:]]
+            self.shift_add(self.cur_line, 1)
             self.total_lines += 1
             self.col = ni
         elif key == KEY_TAB:
@@ -567,8 +1553,8 @@ class Editor:
                             if q != 'a':
                                 self.display_window()
                                 key, char = self.get_input() 
-                                q = char.lower()
-                            if q == 'q' or key == KEY_QUIT:
+                                q = char.lower() if type(char) is str else "" 
+                            if q == 'q' or key in (KEY_QUIT, KEY_ESC):
                                 break
                             elif q in ('a','y'):
                                 self.undo_add(self.cur_line, [self.content[self.cur_line]], KEY_NONE)
@@ -595,6 +1581,7 @@ class Editor:
                     self.delete_lines(False)
                 self.undo_add(self.cur_line, None, KEY_NONE, -len(Editor.yank_buffer))
                 self.content[self.cur_line:self.cur_line] = Editor.yank_buffer 
+                self.shift_add(self.cur_line, len(Editor.yank_buffer))
                 self.total_lines += len(Editor.yank_buffer)
         elif key == KEY_WRITE:
             fname = self.line_edit("Save File: ", self.fname)
@@ -606,6 +1593,9 @@ class Editor:
         elif key == KEY_UNDO:
             if len(self.undo) > 0:
                 action = self.undo.pop(-1) 
+                self.drag = None 
+                self.lvalid = min(self.lvalid, action[0])
+                self.touch(action[0])
                 if not action[3] in (KEY_INDENT, KEY_UNDENT):
                     self.cur_line = action[0] 
                 self.col = action[4]
@@ -614,36 +1604,72 @@ class Editor:
                         self.content[action[0]:action[0] + action[1]] = action[2] 
                     else:
                         self.content += action[2]
+                    if self.wtree is not None: 
+                        self.wtouch.update(range(action[0], action[0] + min(action[1], len(action[2]))))
+                    self.shift_add(action[0] + min(action[1], len(action[2])), len(action[2]) - action[1])
                 else: 
                     del self.content[action[0]:action[0] - action[1]]
+                    self.shift_add(action[0], action[1])
                 self.total_lines = len(self.content) 
                 if len(self.undo) == self.undo_zero:
                     self.changed = ''
                 self.mark = None
         elif key == KEY_REDRAW:
             self.redraw(True)
-    def edit_loop(self): 
+    def edit_loop(self, full = True): 
         if not self.content: 
             self.content = [""]
         self.total_lines = len(self.content)
-        self.redraw(self.message == "")
+        self.drag = None 
+        if full:
+            self.redraw(self.message == "")
         while True:
-            self.display_window() 
-            key, char = self.get_input() 
+            if self.pending(): 
+                self.align_window()
+            else:
+                if Editor.other:
+                    self.show_other()
+                self.display_window() 
             self.message = '' 
+            while self.loader and not self.pending(): 
+                m, n = self.message, self.total_lines
+                self.load(LOAD_LINES)
+                if self.message != m or n < self.top_line + Editor.height: 
+                    self.display_window()
+            key, char = self.get_input() 
+            if Editor.stats: 
+                self.stats_next(key)
+            if self.gline >= 0 and key not in Editor.GAP_KEYS:
+                self.gap_close() 
+            if self.loader and key in Editor.LOAD_KEYS:
+                self.load(END_LINE)
+            if self.readonly and key in Editor.EDIT_KEYS:
+                self.message = "Read only"
+                continue
             if key == KEY_QUIT:
-                if self.changed:
+                if self.changed and not self.twin: 
                     res = self.line_edit("Content changed! Quit without saving (y/N)? ", "N")
                     if not res or res[0].upper() != 'Y':
                         continue
                 self.scroll_region(0)
                 self.mouse_reporting(False) 
+                self.wr('\x1b[?2004l') 
                 self.goto(Editor.height, 0)
                 self.clear_to_eol()
-                self.undo = []
+                self.flush()
+                if not self.twin: 
+                    self.undo = []
+                    if self.loader:
+                        self.loader.close()
+                        self.loader = None
+                    if self.readonly: 
+                        self.content.f.close()
                 return key
-            elif key in (KEY_NEXT, KEY_GET):
+            elif key in (KEY_NEXT, KEY_GET, KEY_SPLIT):
                 return key
+            elif (key == KEY_MOUSE and Editor.other and char[2] & 0x23 < 3 and
+                  not 0 <= char[1] - Editor.ytop <= Editor.height):
+                return KEY_NEXT 
             else:
                 self.handle_edit_keys(key, char)
     def packtabs(self, s):
@@ -663,19 +1689,45 @@ class Editor:
             fname = self.line_edit("Open file: ", "")
         if fname:
             self.fname = fname
+            self.syntax = 'y' if fname.endswith(".py") else 'n'
+            self.lvalid = 0
+            self.wtree = None
             if fname in ('.', '..') or (stat(fname)[0] & 0x4000): 
                 self.content = ["Directory '{}'".format(fname), ""] + sorted(listdir(fname))
+            elif stat(fname)[6] > (gc.mem_free() >> 1 if is_micropython else VIEW_SIZE): 
+                self.content = FileLines(fname)
+                self.syntax = self.write_tabs = 'n'
+                self.readonly = True
+                self.message = "{} lines, read only".format(len(self.content))
             else:
                 if is_micropython:
-                    with open(fname) as f:
-                        self.content = f.readlines()
+                    self.loader = open(fname)
                 else:
-                    with open(fname, errors="ignore") as f:
-                        self.content = f.readlines()
-                Editor.tab_seen = 'n'
-                for i, l in enumerate(self.content):
-                    self.content[i] = expandtabs(l.rstrip('\r\n\t '))
-                self.write_tabs = Editor.tab_seen
+                    self.loader = open(fname, errors="ignore")
+                self.lsize = max(stat(fname)[6], 1)
+                self.content = []
+                self.write_tabs = 'n'
+                self.load(LOAD_LINES) 
+    def load(self, n): 
+        f, k = self.loader, len(self.content)
+        Editor.tab_seen = self.write_tabs
+        for _ in range(n):
+            l = f.readline()
+            if not l: 
+                f.close()
+                self.loader = None
+                break
+            self.content.append(expandtabs(l.rstrip('\r\n\t ')))
+        self.write_tabs = Editor.tab_seen
+        self.total_lines = n = len(self.content)
+        self.touch(k) 
+        t = self.wtree
+        if t is not None and len(t) == k and self.wwidth == Editor.width: 
+            t += [self.line_rows(self.content[i]) for i in range(k, n)]
+        if self.loader:
+            self.message = "Loading {}%".format(divmod(f.tell() * 100, self.lsize)[0])
+        else:
+            self.message = ""
     def put_file(self, fname):
         from os import remove, rename
         tmpfile = fname + ".pyetmp"
@@ -690,6 +1742,301 @@ class Editor:
         except:
             pass
         rename(tmpfile, fname)
+class LineTree:
+    CHUNK = CHUNK_LINES
+    def __init__(self, lines):
+        h = self.CHUNK >> 1
+        self.chunks = [lines[i:i + h] for i in range(0, len(lines), h)] or [[]]
+        self.index()
+    @staticmethod
+    def fenwick(v): 
+        n = len(v)
+        t = [0] + v
+        for j in range(1, n + 1):
+            k = j + (j & -j)
+            if k <= n:
+                t[k] += t[j]
+        return t
+    def index(self): 
+        n = len(self.chunks)
+        t = self.fenwick([len(c) for c in self.chunks])
+        self.tree, self.size, self.top = t, sum(len(c) for c in self.chunks), 1
+        while self.top * 2 <= n:
+            self.top *= 2
+        self.last = (0, 0, 0) 
+    def find(self, i): 
+        k, a, b = self.last
+        if a <= i < b:
+            return k, i - a
+        t, k, m, j = self.tree, 0, self.top, i
+        while m:
+            if k + m < len(t) and t[k + m] <= j:
+                k += m
+                j -= t[k]
+            m >>= 1
+        if k == len(self.chunks):
+            k -= 1
+            j = len(self.chunks[k])
+        self.last = (k, i - j, i - j + len(self.chunks[k]))
+        return k, j
+    def update(self, k, d): 
+        self.size += d
+        k += 1
+        while k < len(self.tree):
+            self.tree[k] += d
+            k += k & -k
+        self.last = (0, 0, 0)
+    def replace(self, a, b, lines): 
+        k, j = self.find(a)
+        c = self.chunks[k]
+        if b - a <= len(c) - j: 
+            c[j:j + b - a] = lines
+            if 0 < len(c) <= self.CHUNK:
+                self.update(k, len(lines) - b + a)
+                return
+            m = k
+        else:
+            m, i = self.find(b)
+            c = c[:j] + lines + self.chunks[m][i:]
+        h = self.CHUNK >> 1 
+        self.chunks[k:m + 1] = [c[i:i + h] for i in range(0, len(c), h)]
+        if not self.chunks:
+            self.chunks = [[]]
+        self.index()
+    def range(self, s): 
+        a = 0 if s.start is None else min(s.start, self.size)
+        return a, max(a, self.size if s.stop is None else min(s.stop, self.size))
+    def __len__(self):
+        return self.size
+    def __getitem__(self, i):
+        if type(i) is slice:
+            a, b = self.range(i)
+            r = []
+            while a < b:
+                k, j = self.find(a)
+                c = self.chunks[k][j:j + b - a]
+                r += c
+                a += len(c)
+            return r
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError
+        k, j = self.find(i)
+        return self.chunks[k][j]
+    def __setitem__(self, i, l):
+        if type(i) is slice:
+            a, b = self.range(i)
+            self.replace(a, b, l)
+        else:
+            k, j = self.find(i + self.size if i < 0 else i)
+            self.chunks[k][j] = l
+    def __delitem__(self, i):
+        a, b = self.range(i) if type(i) is slice else (i, i + 1)
+        self.replace(a, b, [])
+    def __iadd__(self, lines):
+        self.replace(self.size, self.size, lines)
+        return self
+class RowTree(LineTree):
+    CHUNK = WRAP_CHUNK
+    def index(self):
+        LineTree.index(self)
+        self.rtree = self.fenwick([sum(c) for c in self.chunks])
+    def add(self, k, d): 
+        k += 1
+        while k < len(self.rtree):
+            self.rtree[k] += d
+            k += k & -k
+    def replace(self, a, b, rows):
+        k, t = self.find(a)[0], self.rtree
+        d = sum(rows) - sum(self[a:b])
+        LineTree.replace(self, a, b, rows)
+        if self.rtree is t: 
+            self.add(k, d)
+    def __setitem__(self, i, v):
+        if type(i) is slice:
+            LineTree.__setitem__(self, i, v)
+        else:
+            k, j = self.find(i)
+            self.add(k, v - self.chunks[k][j])
+            self.chunks[k][j] = v
+    def rows(self, i): 
+        k, j = self.find(i)
+        s, c = 0, self.chunks[k]
+        for x in range(j):
+            s += c[x]
+        while k > 0:
+            s += self.rtree[k]
+            k &= k - 1
+        return s
+    def find_row(self, r): 
+        t, k, m = self.rtree, 0, self.top
+        while m:
+            if k + m < len(t) and t[k + m] <= r:
+                k += m
+                r -= t[k]
+            m >>= 1
+        i, j = 0, k 
+        while j > 0:
+            i += self.tree[j]
+            j &= j - 1
+        if k < len(self.chunks):
+            for v in self.chunks[k]:
+                if r < v:
+                    break
+                r -= v
+                i += 1
+        return i, r
+class FileLines:
+    def __init__(self, fname):
+        self.f = open(fname, "rb")
+        self.index, n, last = [0], 0, 0
+        if is_micropython: 
+            base = 0
+            while True:
+                b = self.f.read(VIEW_BUF)
+                if not b:
+                    break
+                i = b.find(b"\n")
+                while i >= 0:
+                    n += 1
+                    last = base + i + 1
+                    if n % VIEW_STEP == 0:
+                        self.index.append(last)
+                    i = b.find(b"\n", i + 1)
+                base += len(b)
+            end = base
+        else: 
+            import mmap
+            m = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+            i = m.find(b"\n")
+            while i >= 0:
+                n += 1
+                last = i + 1
+                if n % VIEW_STEP == 0:
+                    self.index.append(last)
+                i = m.find(b"\n", last)
+            end = len(m)
+            m.close()
+        self.size = n + (end > last) 
+        self.blocks = {} 
+    def __len__(self):
+        return self.size
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+    def __getitem__(self, i):
+        if type(i) is slice:
+            return [self[j] for j in range(i.start or 0, self.size if i.stop is None else min(i.stop, self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("line")
+        b, i = divmod(i, VIEW_STEP)
+        if b not in self.blocks:
+            if len(self.blocks) >= 4:
+                self.blocks = {}
+            self.blocks[b] = self.read(b)
+        return self.blocks[b][i]
+    def read(self, b): 
+        self.f.seek(self.index[b])
+        r = []
+        for _ in range(min(VIEW_STEP, self.size - b * VIEW_STEP)):
+            l = self.f.readline()
+            try:
+                l = l.decode()
+            except:
+                l = "".join(chr(c) if c < 0x80 else "?" for c in l)
+            r.append(expandtabs(l.rstrip('\r\n\t ')))
+        return r
+def unescape(s):
+    r, i = [], 0
+    while i < len(s):
+        c = s[i]
+        if c == "\\" and i + 1 < len(s):
+            i += 1
+            c = s[i]
+            if c == "e":
+                c = "\x1b"
+            elif c == "x":
+                c = chr(int(s[i + 1:i + 3], 16))
+                i += 2
+        r.append(c)
+        i += 1
+    return "".join(r)
+def cmp_head(a, b, i, j, p=0, d=0, fill=" "):
+    while i < j and i < p + d and b[i] == fill:
+        i += 1
+    if i < p + d:
+        return i
+    while i < j and i - d < len(a) and a[i - d] == b[i]:
+        i += 1
+    return i
+def cmp_tail(a, b, i, j, p=0, d=0, fill=" "):
+    if j > len(a) + d:
+        return j
+    while j > i and j > p + d and a[j - 1 - d] == b[j - 1]:
+        j -= 1
+    while j > i and j > p and j <= p + d and b[j - 1] == fill:
+        j -= 1
+    return j
+def same8(a, i, b, j): 
+    k = max(min(8, len(a) - i), 0)
+    if k != max(min(8, len(b) - j), 0):
+        return False
+    while k > 0 and a[i + k - 1] == b[j + k - 1]:
+        k -= 1
+    return k == 0
+POW10 = (1000000000, 100000000, 10000000, 1000000, 100000, 10000, 1000, 100, 10, 1)
+def ndigits(n): 
+    k = 1
+    while k < 10 and n >= POW10[9 - k]:
+        k += 1
+    return k
+WIDTHS = (
+    (0x0300, 0x036f, 0), (0x0483, 0x0489, 0), (0x0591, 0x05bd, 0), (0x0610, 0x061a, 0),
+    (0x064b, 0x065f, 0), (0x0670, 0x0670, 0), (0x06d6, 0x06dc, 0), (0x0e31, 0x0e31, 0),
+    (0x0e34, 0x0e3a, 0), (0x0e47, 0x0e4e, 0), (0x1100, 0x115f, 2), (0x1ab0, 0x1aff, 0),
+    (0x1dc0, 0x1dff, 0), (0x200b, 0x200f, 0), (0x20d0, 0x20ff, 0), (0x2e80, 0x303e, 2),
+    (0x3041, 0x33ff, 2), (0x3400, 0x4dbf, 2), (0x4e00, 0x9fff, 2), (0xa000, 0xa4cf, 2),
+    (0xac00, 0xd7a3, 2), (0xf900, 0xfaff, 2), (0xfe00, 0xfe0f, 0), (0xfe20, 0xfe2f, 0),
+    (0xfe30, 0xfe4f, 2), (0xff00, 0xff60, 2), (0xffe0, 0xffe6, 2), (0x1f300, 0x1f64f, 2),
+    (0x1f900, 0x1f9ff, 2), (0x20000, 0x2fffd, 2), (0x30000, 0x3fffd, 2), (0xe0100, 0xe01ef, 0))
+try:
+    isascii = str.isascii 
+except AttributeError:
+    def isascii(s):
+        return s == "" or max(s) < "\x80"
+def char_width(c): 
+    c = ord(c)
+    if c < 0x300:
+        return 1
+    i, j = 0, len(WIDTHS)
+    while i < j: 
+        m = (i + j) >> 1
+        if WIDTHS[m][1] < c:
+            i = m + 1
+        else:
+            j = m
+    return WIDTHS[i][2] if i < len(WIDTHS) and WIDTHS[i][0] <= c else 1
+def str_width(s):
+    return len(s) if isascii(s) else sum(char_width(c) for c in s)
+def is_wide(s): 
+    return not isascii(s) and any(char_width(c) != 1 for c in s)
+def lower_bound(a, x): 
+    i, j = 0, len(a)
+    while i < j:
+        m = (i + j) >> 1
+        if a[m] < x:
+            i = m + 1
+        else:
+            j = m
+    return i
+def printable(s):
+    for c in s:
+        if c < " " or c == "\x7f":
+            return "".join(c for c in s if " " <= c != "\x7f")
+    return s
 def expandtabs(s):
     if '\t' in s:
         Editor.tab_seen = 'y'
@@ -705,8 +2052,13 @@ def expandtabs(s):
         return sb.getvalue()
     else:
         return s
-def pye(*content, tab_size=4, undo=50, device=0):
+def pye(*content, tab_size=4, undo=50, device=0, stats=False, baud=0, keymap=None):
     gc.collect() 
+    Editor.baud = baud
+    if stats: 
+        Editor.stats, Editor.fstats, Editor.lstats = [0] * 6, [0] * 6, [0] * 6
+        if is_micropython:
+            Editor.heap = gc.mem_alloc()
     slot = [Editor(tab_size, undo)]
     index = 0
     if content:
@@ -721,23 +2073,70 @@ def pye(*content, tab_size=4, undo=50, device=0):
             elif type(f) == list and len(f) > 0 and type(f[0]) == str:
                 slot[index].content = f 
             index += 1
+    if keymap: 
+        try:
+            Editor.load_keys(keymap)
+        except Exception as err:
+            slot[0].message = "Keymap {}: {!r}".format(keymap, err)
+    Editor.key_tree()
     Editor.init_tty(device)
+    full = True
     while True:
         try:
             index %= len(slot)
-            key = slot[index].edit_loop() 
+            e = slot[index]
+            key = e.edit_loop(full) 
+            full = True
+            if e.twin: 
+                e.share(e.twin)
+            p = Editor.other
             if key == KEY_QUIT:
-                if len(slot) == 1: 
+                if p: 
+                    o, Editor.other = p["editor"], None
+                    if o.twin: 
+                        slot[slot.index(o.twin)], o.twin.twin, o.twin = o, None, None
+                    if o.content is not e.content:
+                        del slot[index]
+                    index = slot.index(o)
+                elif len(slot) == 1: 
                     break
-                del slot[index]
+                else:
+                    del slot[index]
             elif key == KEY_GET:
                 slot.append(Editor(tab_size, undo))
                 index = len(slot) - 1
                 slot[index].get_file(None)
+            elif key == KEY_SPLIT:
+                if p: 
+                    if p["editor"].twin:
+                        p["editor"].twin.twin = None
+                    Editor.other = None
+                else: 
+                    o = slot[(index + 1) % len(slot)]
+                    o.content = o.content or [""] 
+                    o.total_lines = len(o.content)
+                    Editor.other = {"editor": e.view() if o is e else o, "ytop": 1,
+                        "height": 0, "scrbuf": [], "rows": [], "scrtop": 0, "shifts": [],
+                        "sview": None, "smark": (0, 0), "shl": [-1, 0]}
             elif key == KEY_NEXT:
-                index += 1
+                if p: 
+                    o = p["editor"]
+                    if o.twin: 
+                        b = o.twin
+                        slot[slot.index(b)] = o
+                        if b is not e: 
+                            o.twin = b.twin = None
+                    p["editor"] = e
+                    e.swap_pane()
+                    index = slot.index(o)
+                    full = False
+                else:
+                    index += 1
         except Exception as err:
             slot[index].message = "{!r}".format(err)
     Editor.deinit_tty()
     Editor.yank_buffer = []
+    if Editor.stats:
+        slot[0].stats_next(KEY_NONE)
+        Editor.stats = None
     return slot[0].content if (slot[0].fname == "") else slot[0].fname
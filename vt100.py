@@ -0,0 +1,544 @@
+##
+## Headless VT100 terminal, standing in for the tty behind Editor.wr, Editor.rd
+## and get_screen_size. It keeps a screen grid, counts the bytes, write calls
+## and escape sequences sent per key and checks the screen against the buffer.
+## Linux/CPython only, it is not part of the editor.
+##
+##   term = VT100(24, 80)
+##   e = term.run(["line 1", "line 2"], ["\x1b[B", "abc"], check=True)
+##   term.check(e)  ## raises AssertionError if the screen is wrong
+##   print(term.stats) ## [(key, bytes, writes, escapes), ...]
+##   e = term.run_pye(["file.py"], ["\x10", "\x17"], check=True) ## through pye(), split screen
+##
+## python3 vt100.py [file] runs a few editing scenarios and prints their cost.
+## python3 vt100.py check runs editing sessions with the screen checked after every update.
+##
+import sys, os, random, tempfile
+import pye
+
+class EndOfInput(BaseException): ## not an Exception, which the main loop of pye() would catch
+    pass
+
+XTERM = "\x1b[?64;1;2;6;9;15;18;21;22c" ## device attributes of xterm
+FG = {39: ".", 34: "k", 32: "s", 36: "c", 35: "n"} ## foreground colors of the attribute chars
+
+class VT100:
+    def __init__(self, rows=24, cols=80, da=XTERM, rep=True): ## da "" and rep False: a minimal terminal
+        self.rows, self.cols = rows, cols
+        self.da, self.rep = da, rep
+        self.scr = [[" "] * cols for i in range(rows)]
+        self.att = [[0] * cols for i in range(rows)]
+        self.r = self.c = 0
+        self.wrap = False ## cursor at the right edge, wrap before the next char
+        self.top, self.bot = 0, rows - 1
+        self.sgr = 0 ## (bold, fg, bg) or 0 for the default
+        self.last = " " ## last char written, for REP
+        self.state = ""
+        self.reply = "" ## answers to the editor, read before the keys
+        self.keys = []
+        self.typeahead = False
+        self.unknown = [] ## sequences not understood
+        self.stats = [] ## (key, bytes, writes, escapes) per key
+        self.key = None
+        self.error = None ## a failed check inside pye(), raised again when it is left
+        self.nbytes = self.nwrites = self.nesc = 0
+
+## Interface to the editor
+    def write(self, data): ## bytes, as sent by the editor, or str
+        if not isinstance(data, str):
+            data = data.decode("utf-8")
+        self.nwrites += 1
+        self.nbytes += len(data.encode("utf-8"))
+        for ch in data:
+            self.feed(ch)
+
+    def readinto(self, b): ## the pending reply or the next key, as much as fits into b
+        if not self.reply:
+            self.count()
+            if not self.keys:
+                raise EndOfInput()
+            self.key = self.reply = self.keys.pop(0)
+        s = self.reply.encode("utf-8")[:len(b)].decode("utf-8", "ignore") ## whole chars only
+        d = s.encode("utf-8")
+        b[:len(d)] = d
+        self.reply = self.reply[len(s):]
+        return len(d)
+
+    def pending(self, ms=0):
+        return bool(self.reply) or (self.typeahead and bool(self.keys))
+
+    def count(self): ## close the counters of the current key
+        if self.key is not None or self.nbytes:
+            self.stats.append((self.key, self.nbytes, self.nwrites, self.nesc))
+        self.nbytes = self.nwrites = self.nesc = 0
+
+    def attach(self):
+        E = pye.Editor
+        term = self
+        E.caps = None ## probe this terminal
+        E.init_tty = staticmethod(lambda device: None)
+        E.deinit_tty = staticmethod(lambda: None)
+        def send(self, b): ## like the Linux send, with a single write
+            if E.stats:
+                E.fstats[0] += len(b)
+                E.fstats[1] += 1
+            term.write(bytes(b))
+        E.send = send
+        E.rd_raw = lambda self, b: term.readinto(b)
+        E.waiting = lambda self, ms=0: term.pending(ms)
+        E.ipos = E.ilen = 0
+        E.kback = E.other = None ## nothing left over from a run before
+        E.yank_buffer = []
+
+    def run(self, content, keys, typeahead=False, setup=None, check=False): ## edit content with keys
+        self.attach()
+        self.keys = list(keys)
+        self.typeahead = typeahead
+        e = pye.Editor(4, 50)
+        e.content = list(content)
+        if setup:
+            setup(e)
+        if check: ## verify the screen after every update
+            show = e.display_window
+            def display_window():
+                show()
+                self.check(e)
+            e.display_window = display_window
+        try:
+            e.edit_loop()
+        except EndOfInput:
+            pass
+        return e
+
+    def run_pye(self, content, keys, typeahead=False, check=False, **kw): ## edit through pye(), with its buffers and panes
+        self.attach()
+        self.keys = list(keys)
+        self.typeahead = typeahead
+        E, term, show = pye.Editor, self, pye.Editor.display_window
+        def display_window(e, focus=True): ## the last editor with the focus is returned
+            show(e, focus)
+            if focus:
+                term.editor = e
+                if check:
+                    try:
+                        term.check(e)
+                    except AssertionError as err: ## pye() would catch it and show it as a message
+                        term.error = err
+                        raise EndOfInput()
+        E.display_window = display_window
+        self.editor, self.error = None, None
+        try:
+            pye.pye(*content, **kw)
+        except EndOfInput:
+            pass
+        finally:
+            E.display_window = show
+        if self.error:
+            raise self.error
+        return self.editor
+
+## Screen contents
+    def lines(self):
+        return ["".join(r).rstrip() for r in self.scr]
+
+    def view(self, e, height): ## the rows the editor e should show
+        E, rows = pye.Editor, []
+        i, s = e.top_line, e.top_sub
+        for r in range(height):
+            if i >= e.total_lines:
+                rows.append("")
+                continue
+            l = e.content[i]
+            if e.wrap == "y":
+                st = e.wrap_starts(l)
+                rows.append(l[st[s]:st[s + 1] if s + 1 < len(st) else len(l)].rstrip())
+                if s + 1 < len(st):
+                    s += 1
+                    continue
+            else:
+                m = e.margin if e.wrap == "n" or i == e.cur_line else 0
+                a, b, pad = e.cells(l, m, E.width)
+                t = " " * pad + l[a:b]
+                if e.wrap == "l" and (m or b < len(l)): ## only the cursor line scrolls
+                    t = e.cut_marks((False, t, ""), m > 0, b < len(l))[1]
+                rows.append(t.rstrip())
+            i += 1
+            s = 0
+        return rows
+
+    def check(self, e): ## the screen shows the buffer of e and the cursor is in place
+        E = pye.Editor
+        e.gap_sync() ## the line being typed into
+        self.check_pane(e, E.ytop, E.height)
+        if E.other: ## split screen
+            self.check_pane(E.other["editor"], E.other["ytop"], E.other["height"])
+        l = e.content[e.cur_line]
+        c = e.wrap_pos()[1] if e.wrap == "y" else e.scol(l, e.col) - e.margin
+        assert (self.r, self.c) == (E.ytop + e.row, c) or self.wrap, "cursor at {}, expected {}".format(
+            (self.r, self.c), (E.ytop + e.row, c))
+        assert not self.unknown, "unknown sequences {}".format(self.unknown)
+
+    def check_pane(self, e, ytop, height): ## the rows ytop.. of the screen show the buffer of e
+        got = self.lines()[ytop:ytop + height]
+        for r, (a, b) in enumerate(zip(self.view(e, height), got)):
+            assert a == b, "row {}: expected {!r}, got {!r}".format(ytop + r, a, b)
+        if e.syntax == "y" and e.wrap == "n": ## and the colors of ASCII lines
+            for r in range(min(height, e.total_lines - e.top_line)):
+                l = e.content[e.top_line + r]
+                if pye.isascii(l):
+                    a, b = e.margin, min(len(l), e.margin + pye.Editor.width)
+                    want, got = self.colors(ytop + r, l[a:b], e.line_attrs(e.top_line + r)[a:b])
+                    assert want == got, "row {}: expected colors {!r}, got {!r}".format(ytop + r, want, got)
+
+    def colors(self, r, t, attrs): ## attrs and the colors shown on row r for the text t, both without blanks
+        return ("".join(a if ch != " " else "." for ch, a in zip(t, attrs)),
+                "".join(FG.get(c[1] if c else 39, "?") if ch != " " else "." for ch, c in zip(t, self.att[r])))
+
+## Terminal emulation
+    def feed(self, ch):
+        s = self.state
+        if s == "":
+            if ch == "\x1b":
+                self.state = ch
+                self.nesc += 1
+            elif ch == "\r":
+                self.c, self.wrap = 0, False
+            elif ch == "\n":
+                self.lf()
+                self.wrap = False
+            elif ch == "\b":
+                self.c, self.wrap = max(self.c - 1, 0), False
+            elif ch >= " ":
+                self.put(ch)
+        elif s == "\x1b":
+            self.state = "\x1b[" if ch == "[" else ""
+            if ch != "[":
+                self.wrap = False
+                if ch == "D":
+                    self.lf()
+                elif ch == "M":
+                    self.ri()
+                elif ch == "E":
+                    self.c = 0
+                    self.lf()
+                else:
+                    self.unknown.append("ESC " + ch)
+        elif ch.isalpha() or ch in "@`~":
+            self.state = ""
+            self.csi(s[2:], ch)
+        else:
+            self.state += ch
+
+    def put(self, ch):
+        w = pye.char_width(ch)
+        row = self.scr[self.r]
+        if w == 0: ## combining mark, add it to the previous char
+            c = self.c if self.wrap else self.c - 1
+            if c > 0 and row[c] == "":
+                c -= 1
+            if c >= 0:
+                row[c] += ch
+            return
+        if self.wrap or self.c + w > self.cols:
+            self.c, self.wrap = 0, False
+            self.lf()
+            row = self.scr[self.r]
+        for c in (self.c, self.c + w - 1): ## a half overwritten wide char is erased
+            if c > 0 and row[c] == "":
+                row[c - 1] = " "
+            if c + 1 < self.cols and row[c + 1] == "":
+                row[c + 1] = " "
+        row[self.c] = ch
+        self.att[self.r][self.c] = self.sgr
+        if w == 2:
+            row[self.c + 1] = ""
+            self.att[self.r][self.c + 1] = self.sgr
+        self.last = ch
+        if self.c + w >= self.cols:
+            self.c, self.wrap = self.cols - 1, True
+        else:
+            self.c += w
+
+    def scroll(self, n, top, bot): ## move rows top..bot up by n, or down if n < 0
+        for i in range(abs(n)):
+            if n > 0:
+                del self.scr[top], self.att[top]
+                self.scr.insert(bot, [" "] * self.cols)
+                self.att.insert(bot, [0] * self.cols)
+            else:
+                del self.scr[bot], self.att[bot]
+                self.scr.insert(top, [" "] * self.cols)
+                self.att.insert(top, [0] * self.cols)
+
+    def lf(self):
+        if self.r == self.bot:
+            self.scroll(1, self.top, self.bot)
+        elif self.r < self.rows - 1:
+            self.r += 1
+
+    def ri(self):
+        if self.r == self.top:
+            self.scroll(-1, self.top, self.bot)
+        elif self.r > 0:
+            self.r -= 1
+
+    def erase(self, r, c0, c1):
+        row = self.scr[r]
+        if c0 > 0 and row[c0] == "":
+            row[c0 - 1] = " "
+        for c in range(c0, c1):
+            row[c] = " "
+            self.att[r][c] = self.sgr
+
+    def csi(self, p, f):
+        if p and p[0] in "?>": ## private modes: cursor, mouse, paste
+            return
+        args = [int(i) if i else 0 for i in p.split(";")] if p else [0]
+        n = max(args[0], 1)
+        self.wrap = self.wrap and f in "m"
+        if f == "A":
+            self.r = max(self.r - n, self.top if self.r >= self.top else 0)
+        elif f == "B":
+            self.r = min(self.r + n, self.bot if self.r <= self.bot else self.rows - 1)
+        elif f == "C":
+            self.c = min(self.c + n, self.cols - 1)
+        elif f == "D":
+            self.c = max(self.c - n, 0)
+        elif f in "Hf":
+            self.r = min(max(args[0], 1), self.rows) - 1
+            self.c = min(max(args[1] if len(args) > 1 else 1, 1), self.cols) - 1
+        elif f == "J":
+            if args[0] == 0:
+                self.erase(self.r, self.c, self.cols)
+                for r in range(self.r + 1, self.rows):
+                    self.erase(r, 0, self.cols)
+            elif args[0] == 2:
+                for r in range(self.rows):
+                    self.erase(r, 0, self.cols)
+        elif f == "K":
+            if args[0] == 0:
+                self.erase(self.r, self.c, self.cols)
+            elif args[0] == 1:
+                self.erase(self.r, 0, self.c + 1)
+            else:
+                self.erase(self.r, 0, self.cols)
+        elif f == "X":
+            self.erase(self.r, self.c, min(self.c + n, self.cols))
+        elif f in "LM":
+            if self.top <= self.r <= self.bot:
+                self.scroll(n if f == "M" else -n, self.r, self.bot)
+                self.c = 0
+        elif f in "ST":
+            self.scroll(n if f == "S" else -n, self.top, self.bot)
+        elif f in "@P":
+            row, att = self.scr[self.r], self.att[self.r]
+            for i in range(n):
+                if f == "@":
+                    row.insert(self.c, " ")
+                    att.insert(self.c, self.sgr)
+                    del row[-1], att[-1]
+                else:
+                    del row[self.c], att[self.c]
+                    row.append(" ")
+                    att.append(self.sgr)
+        elif f == "b": ## REP, ignored by a minimal terminal
+            for i in range(n if self.rep else 0):
+                self.put(self.last)
+        elif f == "r":
+            self.top = min(max(args[0], 1), self.rows) - 1
+            self.bot = min(args[1] if len(args) > 1 and args[1] else self.rows, self.rows) - 1
+            self.r = self.c = 0
+        elif f == "m":
+            b, fg, bg = self.sgr or (0, 39, 49)
+            for a in args:
+                if a == 0:
+                    b, fg, bg = 0, 39, 49
+                elif a in (1, 22):
+                    b = a == 1
+                elif 30 <= a <= 39:
+                    fg = a
+                elif 40 <= a <= 49:
+                    bg = a
+            self.sgr = (b, fg, bg) if (b, fg, bg) != (0, 39, 49) else 0
+        elif f == "n":
+            if args[0] == 6: ## cursor position report
+                self.reply += "\x1b[{};{}R".format(self.r + 1, self.c + 1)
+        elif f == "c":
+            self.reply += self.da
+        else:
+            self.unknown.append("CSI " + p + f)
+
+## Benchmark: editing scenarios with the cost of their output
+SCENARIOS = (
+    ("type a line", ["\x1b[B"] * 5 + list("hello world")),
+    ("line down x40", ["\x1b[B"] * 40),
+    ("page down x3", ["\x1b[6~"] * 3),
+    ("enter at top", ["\r"] * 5),
+    ("join at top", ["\x1b[B", "\x7f"] * 5),
+    ("end of long line", ["\x1b[B"] * 3 + ["\x1b[F", "\x1b[H"]),
+    ("paste 10 lines", ["\x1b[200~" + "pasted line\r" * 10 + "\x1b[201~"]),
+    ("wheel scroll", ["\x1b[Ma!!"] * 5 + ["\x1b[M`!!"] * 5),
+)
+
+def bench(content, rows=24, cols=80, **kw):
+    print("{:20} {:>8} {:>7} {:>7}".format("scenario", "bytes", "writes", "escapes"))
+    for name, keys in SCENARIOS:
+        term = VT100(rows, cols, **kw)
+        term.run(content, keys, check=True)
+        stats = term.stats[1:] ## without the initial redraw
+        print("{:20} {:8} {:7} {:7}".format(name, sum(i[1] for i in stats),
+              sum(i[2] for i in stats), sum(i[3] for i in stats)))
+
+## Checks: editing sessions with the screen verified after every update, some of
+## them run twice to compare the gap buffer or the LineTree with the plain list.
+## python3 vt100.py check runs them all, and stops at the first failure.
+UP, DOWN, LEFT, RIGHT = "\x1b[A", "\x1b[B", "\x1b[D", "\x1b[C"
+HOME, END, PGUP, PGDN = "\x1b[H", "\x1b[F", "\x1b[5~", "\x1b[6~"
+KEYS = [UP, DOWN, LEFT, RIGHT, HOME, END, PGUP, PGDN, "\x7f", "\x1b[3~", "\r", "\t", "\x1b[Z",
+        "\x0c", "\x18", "\x16", "\x04", "\x1a", "\x1b[200~pasted\rtext\x1b[201~"] ## and chars
+TEXT = ["{:4} ".format(i) + "the quick brown fox jumps over the lazy dog " * (i % 4) for i in range(200)]
+PYTHON = ["def f(x): ## a comment", "    s = '''a", "string''' + \"b\" + str(1.5)",
+          "    return s if x else None", "", "class C:", "    pass"] * 10
+WIDE = ["wide \u4e2d\u6587 chars " * (i % 5) + "e\u0301 combined" for i in range(60)]
+
+def session(seed, n, chars="ab "): ## n random keys
+    rnd = random.Random(seed)
+    return [rnd.choice(KEYS) if rnd.random() < 0.4 else rnd.choice(chars) for i in range(n)]
+
+def state(e): ## content and cursor, to compare sessions
+    e.gap_sync()
+    return list(e.content), e.cur_line, e.col
+
+def setter(**kw): ## setup function setting the attributes kw of the editor
+    return lambda e: [setattr(e, k, v) for k, v in kw.items()]
+
+def temp_file(lines, name="pye_check.txt"):
+    fname = os.path.join(tempfile.mkdtemp(), name)
+    with open(fname, "w") as f:
+        f.write("".join(l + "\n" for l in lines))
+    return fname
+
+def check_wrap():
+    for w in "yl": ## set by Ctrl-A at 80 columns
+        e = VT100(24, 80).run(TEXT, ["\x01", ",,,,," + w, "\r"] + session(0, 50), check=True)
+        assert e.wrap == w, "wrap {} not set".format(w)
+        for text in (TEXT, WIDE):
+            VT100(24, 80).run(text, session(1, 300) + [PGDN] * 4 + [END, HOME] + [UP] * 30,
+                              setup=setter(wrap=w), check=True)
+
+def check_syntax(): ## colors too, also after a quote changes the lexer state of the lines below
+    keys = [DOWN, END] + ["\x7f"] * 3 + ["'"] * 3 + [DOWN] * 3 + ['"'] * 3 + ["\x1a"] * 8
+    VT100(24, 80).run(PYTHON, keys + session(2, 300, "ab'\"#1 "), setup=setter(syntax="y"), check=True)
+
+def check_paste(): ## control chars in a paste are dropped, as for typed keys
+    e = VT100(24, 80).run(["abc", "def"], ["\x1b[200~x\x0cy\x1b[2Jz\x07w\x7f\r\tv\x1b[201~"], check=True)
+    assert e.content == ["xy[2Jzw", "        vabc", "def"], "paste: {!r}".format(e.content)
+
+def check_keys(): ## an unknown sequence is skipped up to its end, not into the next key
+    for seq in ("\x1b1", "\x1b ", "\x1b,", "\x1b[99;5X", "\x1bOz", "\x1b[1;5Q", "\x1b[15~"):
+        e = VT100(24, 80).run(["start"], [seq, "typed"], check=True)
+        assert e.content == ["typedstart"], "key {!r}: {!r}".format(seq, e.content)
+
+def check_split():
+    VT100(24, 80).run_pye([list(TEXT), list(PYTHON)], ["\x10"] + session(3, 100) + ["\x17"] +
+                          session(4, 100) + ["\x17", "\x10"], check=True)
+    VT100(24, 80).run_pye([list(TEXT)], ["\x10"] + session(5, 100) + ["\x17", "\x01", ",,,,,y", "\r"] +
+                           session(6, 50) + ["\x01", ",,,,y,l", "\r", "\x17"] + session(7, 50), check=True)
+    fname = temp_file(PYTHON, "split.py") ## a quote typed in one view changes the colors below in both
+    VT100(24, 80).run_pye([fname], ["\x10", "'''", "\x17", PGDN, "\x17", DOWN, '"""', "\x17", "'"] +
+                          session(12, 300, "ab'\"#1 ") + ["\x17"] + session(13, 300, "ab'\"#1 "), check=True)
+    fname = temp_file(TEXT, "a_long_file_name_" * 6 + ".txt") ## the prompt default must stay in its pane
+    VT100(24, 80).run_pye([fname], ["\x10", "\x13", "\x1b", DOWN, "\x17", "\x13", "\x1b", DOWN], check=True)
+
+def check_gap(): ## the same session with and without the gap buffer, but for undo: a record per run of typing
+    text = ["x" * 300 + " long line {}".format(i) for i in range(30)]
+    keys = [DOWN, END] + session(8, 2000)
+    for w in "nl":
+        VT100(24, 80).run(text, keys, typeahead=True, setup=setter(wrap=w), check=True)
+        keys = [k for k in keys if k != "\x1a"]
+        a = VT100(24, 80).run(text, keys, typeahead=True, setup=setter(wrap=w), check=True)
+        n, pye.GAP_LINE = pye.GAP_LINE, 1 << 30
+        try:
+            b = VT100(24, 80).run(text, keys, typeahead=True, setup=setter(wrap=w), check=True)
+        finally:
+            pye.GAP_LINE = n
+        assert state(a) == state(b), "gap buffer, wrap {}: different content or cursor".format(w)
+
+def check_line_tree(): ## the same session with a list and with a LineTree of small chunks
+    keys = session(9, 3000)
+    a = VT100(24, 80).run(TEXT, keys, check=True)
+    n, pye.LineTree.CHUNK = pye.LineTree.CHUNK, 8
+    try:
+        b = VT100(24, 80).run(TEXT, keys, setup=lambda e: setattr(e, "content", pye.LineTree(TEXT)), check=True)
+    finally:
+        pye.LineTree.CHUNK = n
+    assert type(b.content) is pye.LineTree and state(a) == state(b), "line tree: different content or cursor"
+
+def check_file_lines(): ## a file viewed read only
+    text = ["line {}:".format(i) + "." * (i % 90) for i in range(1000)]
+    fname = temp_file(text)
+    def setup(e):
+        e.content, e.readonly, e.fname = pye.FileLines(fname), True, fname
+    e = VT100(24, 80).run([], [PGDN] * 5 + [DOWN, END, "abc", "\r", "\x07", "900", "\r", "\x02", UP, "\x14",
+                               PGDN, PGUP, "\x06", "line 77:", "\r", "\x01", ",,,,y,y", "\r"], setup=setup, check=True)
+    assert list(e.content) == text and e.cur_line == 77, "file view: wrong lines"
+    assert e.syntax == "n" and e.wrap == "n", "file view: syntax or wrap set"
+    e.content.f.close()
+
+def check_load(): ## keys typed while a file is loading, and a file large enough for a LineTree
+    for n in (3000, 25000):
+        text = ["{} loaded:".format(i) + "abc" * (i % 30) for i in range(n)]
+        fname = temp_file(text)
+        term, polls = VT100(24, 80), [0]
+        def pending(ms=0, pending=term.pending): ## a key waits at every third poll only
+            polls[0] += 1
+            return pending(ms) or (polls[0] % 3 == 0 and bool(term.keys))
+        term.pending = pending
+        e = term.run_pye([fname], [DOWN] * 3 + [PGDN] * 3 + list("typed") + ["\x1a"] * 5 +
+                         ["\x02"] + [UP] * 5 + ["\x14"], check=True)
+        assert list(e.content) == text and e.loader is None, "load: wrong lines"
+        assert type(e.content) is (list if n < pye.BIG_FILE else pye.LineTree), "load: wrong container"
+
+def check_update_line(): ## random pairs of rows, the screen row must show the new one
+    rnd = random.Random(10)
+    for caps in ("LXSb", ""):
+        term = VT100(4, 40)
+        e = term.run([""], [])
+        pye.Editor.caps = caps
+        for i in range(5000):
+            old = "".join(rnd.choice("ab  ") for i in range(rnd.randint(0, 40)))
+            new = list(old)
+            for j in range(rnd.randint(0, 3)): ## a few inserts or deletes
+                p = rnd.randint(0, len(new))
+                if rnd.random() < 0.5:
+                    new[p:p] = rnd.choice("abc ") * rnd.randint(1, 9)
+                else:
+                    del new[p:p + rnd.randint(1, 9)]
+            new = "".join(new)[:40]
+            color = rnd.random() < 0.3
+            oa, na = ["".join(rnd.choice(".ks") for c in t) if color else "" for t in (old, new)]
+            e.update_line(0, (False, "\x00" * 40, ""), (False, old, oa))
+            e.update_line(0, (False, old, oa), (False, new, na))
+            e.flush()
+            assert term.lines()[0] == new.rstrip(), "{!r} -> {!r}: got {!r}".format(old, new, term.lines()[0])
+            if color:
+                want, got = term.colors(0, new, na)
+                assert want == got, "{!r} -> {!r}: colors {!r}, got {!r}".format(old, new, want, got)
+
+CHECKS = (check_wrap, check_syntax, check_paste, check_keys, check_split, check_gap, check_line_tree, check_file_lines,
+          check_load, check_update_line)
+
+if __name__ == "__main__" and sys.argv[1:] == ["check"]:
+    for f in CHECKS:
+        f()
+        print("{:20} ok".format(f.__name__))
+elif __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            text = [l.rstrip("\r\n") for l in f]
+    else:
+        text = ["{:4} ".format(i) + "the quick brown fox jumps over the lazy dog " * (1 + i % 3)
+                for i in range(200)]
+    bench(text)
+    print("\nMinimal VT100 terminal")
+    bench(text, da="", rep=False)